@@ -0,0 +1,2 @@
+# The batch scanner CLI and the load generator match pytest's file patterns but are scripts
+collect_ignore = ["test_model.py", "load_test.py"]
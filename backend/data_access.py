@@ -0,0 +1,176 @@
+import asyncio
+import httpx
+
+REPORTS_TABLE = "reports"
+USERS_TABLE = "users"
+IMAGES_BUCKET = "images"
+
+
+class DataAccessError(Exception):
+    """Raised when Supabase rejects a request or cannot be reached"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_duplicate_error(error: Exception) -> bool:
+    """True when an upload was rejected because the object name is already taken"""
+    if not isinstance(error, DataAccessError):
+        return False
+    if error.status_code == 409:
+        return True
+    # Storage reports duplicates as 400 with {"statusCode": "409", "error": "Duplicate"}
+    return error.status_code == 400 and ("Duplicate" in str(error) or "already exists" in str(error))
+
+
+class SupabaseDataAccess:
+    """Async access to the `reports`/`users` tables and the `images` bucket.
+
+    Talks to PostgREST and Supabase Storage directly over one pooled
+    `httpx.AsyncClient` (keep-alive, per-call timeouts) and caps the number of
+    in-flight calls with a semaphore so a burst of requests queues here instead
+    of exhausting the pool or blocking the event loop.
+    """
+
+    def __init__(self, url: str, key: str, max_connections: int = 50,
+                 max_keepalive: int = 20, keepalive_expiry: float = 30.0,
+                 timeout: float = 15.0, max_concurrency: int = 32):
+        self.url = url.rstrip('/')
+        self.key = key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._semaphore = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.url,
+                headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, timeout: float = None, **kwargs):
+        await self.start()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        async with self._semaphore:
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                raise DataAccessError(f"{method} {path} failed: {e}") from e
+        if response.status_code >= 400:
+            raise DataAccessError(f"{method} {path} returned {response.status_code}: {response.text}", response.status_code)
+        return response
+
+    @staticmethod
+    def _query_params(columns: str = None, eq: dict = None, gte: dict = None,
+                      order: str = None, desc: bool = False, limit: int = None, offset: int = None):
+        params = []
+        if columns is not None:
+            params.append(("select", columns.replace(' ', '')))
+        for column, value in (eq or {}).items():
+            params.append((column, f"eq.{value}"))
+        for column, value in (gte or {}).items():
+            params.append((column, f"gte.{value}"))
+        if order:
+            direction = "desc" if desc else "asc"
+            params.append(("order", ",".join(f"{column.strip()}.{direction}" for column in order.split(','))))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        if offset:
+            params.append(("offset", str(offset)))
+        return params
+
+    async def select(self, table: str, columns: str = "*", eq: dict = None, gte: dict = None,
+                     order: str = None, desc: bool = False, limit: int = None, offset: int = None,
+                     timeout: float = None):
+        params = self._query_params(columns, eq, gte, order, desc, limit, offset)
+        response = await self._request("GET", f"/rest/v1/{table}", params=params, timeout=timeout)
+        return response.json()
+
+    async def select_all(self, table: str, columns: str = "*", eq: dict = None, order: str = None,
+                         desc: bool = False, page_size: int = 1000):
+        """Select every matching row, paging past the PostgREST row limit.
+
+        Rows are only stable between pages under an ORDER BY, so `order` is
+        required and must end in a unique column (e.g. "timestamp,report_id").
+        """
+        if not order:
+            raise ValueError("select_all needs an order column to page reliably")
+        rows = []
+        while True:
+            page = await self.select(table, columns, eq=eq, order=order, desc=desc, limit=page_size, offset=len(rows))
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    async def count(self, table: str, eq: dict = None, gte: dict = None, column: str = "*"):
+        params = self._query_params(column, eq, gte)
+        response = await self._request("HEAD", f"/rest/v1/{table}", params=params,
+                                       headers={"Prefer": "count=exact"})
+        content_range = response.headers.get("content-range", "")
+        total = content_range.rsplit('/', 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    async def insert(self, table: str, values: dict):
+        response = await self._request("POST", f"/rest/v1/{table}", json=values,
+                                       headers={"Prefer": "return=representation"})
+        return response.json()
+
+    async def update(self, table: str, values: dict, eq: dict):
+        params = self._query_params(eq=eq)
+        response = await self._request("PATCH", f"/rest/v1/{table}", params=params, json=values,
+                                       headers={"Prefer": "return=representation"})
+        return response.json()
+
+    async def delete(self, table: str, eq: dict):
+        params = self._query_params(eq=eq)
+        response = await self._request("DELETE", f"/rest/v1/{table}", params=params,
+                                       headers={"Prefer": "return=representation"})
+        return response.json()
+
+    async def list_images(self, page_size: int = 1000):
+        files = []
+        while True:
+            response = await self._request("POST", f"/storage/v1/object/list/{IMAGES_BUCKET}", json={
+                "prefix": "",
+                "limit": page_size,
+                "offset": len(files),
+                "sortBy": {"column": "name", "order": "asc"}
+            })
+            page = response.json()
+            files.extend(page)
+            if len(page) < page_size:
+                return files
+
+    async def upload_image(self, filename: str, data: bytes, content_type: str = "image/png"):
+        await self._request("POST", f"/storage/v1/object/{IMAGES_BUCKET}/{filename}", content=data,
+                            headers={"Content-Type": content_type, "x-upsert": "false"},
+                            timeout=60.0)
+        return self.public_image_url(filename)
+
+    def public_image_url(self, filename: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{IMAGES_BUCKET}/{filename}"
+
+    def image_filename_from_url(self, image_url: str):
+        """Return the bucket object name for an image URL we issued, else None"""
+        return image_url.split('/')[-1] if 'supabase' in image_url else None
+
+    async def remove_images(self, filenames: list):
+        response = await self._request("DELETE", f"/storage/v1/object/{IMAGES_BUCKET}",
+                                       json={"prefixes": filenames})
+        return response.json()
@@ -0,0 +1,130 @@
+from datetime import datetime
+import asyncio
+import itertools
+import json
+
+GLOBAL_CHANNEL = "global"
+
+# Seconds between heartbeats on an idle stream
+HEARTBEAT_INTERVAL = 15.0
+# Events buffered per subscriber before it is told to resync
+MAX_QUEUED_EVENTS = 100
+
+
+def user_channel(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """One client's bounded event queue.
+
+    A subscriber that falls `max_queued` events behind has its backlog dropped
+    and receives a single `resync` event instead, telling the client to refetch
+    over HTTP; publishers never block on slow consumers.
+    """
+
+    def __init__(self, channels: list, max_queued: int = MAX_QUEUED_EVENTS):
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=max_queued)
+        self.dropped = 0
+
+    def deliver(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({
+                "id": event["id"],
+                "channels": event["channels"],
+                "type": "resync",
+                "data": {"reason": "subscriber fell behind"},
+                "timestamp": event["timestamp"]
+            })
+
+    async def get(self, timeout: float = HEARTBEAT_INTERVAL):
+        """Next event, or a heartbeat if nothing arrives within `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return {"type": "heartbeat", "timestamp": datetime.utcnow().isoformat()}
+
+
+class EventBroker:
+    """In-process pub/sub for report and leaderboard changes.
+
+    Write endpoints publish to the global channel and to `user:<id>`; the SSE
+    and WebSocket endpoints subscribe clients to one or both. An event published
+    to several channels reaches each subscriber once.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._subscribed = asyncio.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len({id(s) for subs in self._subscribers.values() for s in subs})
+
+    def subscribe(self, channels: list) -> Subscription:
+        subscription = Subscription(channels)
+        for channel in channels:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        self._subscribed.set()
+        return subscription
+
+    async def wait_for_subscriber(self):
+        """Return once at least one client is subscribed"""
+        while not self.subscriber_count:
+            self._subscribed.clear()
+            await self._subscribed.wait()
+
+    def unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def has_subscribers(self, channel: str) -> bool:
+        return bool(self._subscribers.get(channel))
+
+    def publish(self, channels, event_type: str, data: dict):
+        """Deliver one event to every subscriber of any of `channels` (a name or a list)"""
+        if isinstance(channels, str):
+            channels = [channels]
+        event = {
+            "id": next(self._ids),
+            "channels": channels,
+            "type": event_type,
+            "data": data,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        recipients = {}
+        for channel in channels:
+            for subscription in self._subscribers.get(channel, ()):
+                recipients[id(subscription)] = subscription
+        for subscription in recipients.values():
+            subscription.deliver(event)
+        return event
+
+
+def format_sse(event: dict) -> str:
+    """Serialize an event as a Server-Sent Events frame (heartbeats become comments)"""
+    if event["type"] == "heartbeat":
+        return f": heartbeat {event['timestamp']}\n\n"
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def diff_leaderboard(previous: dict, leaderboard: list):
+    """Compare a leaderboard with the previous snapshot (user_id -> entry).
+
+    Returns (snapshot, changed entries, removed user ids).
+    """
+    snapshot = {entry["user_id"]: entry for entry in leaderboard}
+    changed = [entry for user_id, entry in snapshot.items() if previous.get(user_id) != entry]
+    removed = [user_id for user_id in previous if user_id not in snapshot]
+    return snapshot, changed, removed
@@ -0,0 +1,406 @@
+import asyncio
+import io
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Longest image side handed to the workers; YOLO resizes to 640 anyway, and a
+# fixed bound keeps every shared-memory slot the same (12 MB) size.
+MAX_IMAGE_SIDE = 2048
+
+
+class InferenceError(Exception):
+    """Raised when a YOLO worker fails, crashes or times out on a job"""
+
+
+def decode_image(data: bytes, max_side: int = MAX_IMAGE_SIDE):
+    """Decode uploaded bytes into a contiguous BGR uint8 array (YOLO's numpy convention)"""
+    return decode_image_with_size(data, max_side)[0]
+
+
+def decode_image_with_size(data: bytes, max_side: int = MAX_IMAGE_SIDE):
+    """Like decode_image, but also return the upright (width, height) before downscaling"""
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    size = img.size
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side))
+    return np.ascontiguousarray(np.asarray(img)[:, :, ::-1]), size
+
+
+def save_bgr_image(image, path: str):
+    """Save a BGR array (as returned by YOLO's plot()) as an RGB image file"""
+    from PIL import Image
+
+    Image.fromarray(np.ascontiguousarray(image[:, :, ::-1])).save(path)
+
+
+def _slot_views(buffer, shapes):
+    """uint8 arrays of the given shapes laid out back to back in a shared-memory slot"""
+    views, offset = [], 0
+    for shape in shapes:
+        views.append(np.ndarray(shape, dtype=np.uint8, buffer=buffer, offset=offset))
+        offset += shape[0] * shape[1] * shape[2]
+    return views
+
+
+def _worker_main(model_path, cores, shm_names, request_conn, result_conn):
+    """Inference worker: load the model once, then serve jobs from shared-memory slots.
+
+    A job is one or more images packed into a slot; they go through the model
+    as a single batch.
+    """
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    try:
+        import torch
+        torch.set_num_threads(max(1, len(cores)))
+    except ImportError:
+        pass
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    slots = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    result_conn.send(("ready", None, None))
+
+    while True:
+        try:
+            message = request_conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        job_id, slot, shapes, annotate = message
+        try:
+            images = _slot_views(slots[slot].buf, shapes)
+            results = model(images, verbose=False)
+            detections = [
+                [
+                    {
+                        "box": [round(float(v), 1) for v in box],
+                        "confidence": round(float(conf), 4),
+                        "class_id": int(cls),
+                        "label": result.names.get(int(cls), str(int(cls)))
+                    }
+                    for box, conf, cls in zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist(), result.boxes.cls.tolist())
+                ]
+                for result in results
+            ]
+            if annotate:
+                # Annotated images have the inputs' shapes, so they go back through the same slot
+                for view, result in zip(images, results):
+                    view[...] = result.plot()
+            del images
+            result_conn.send((job_id, detections, None))
+        except Exception as e:
+            result_conn.send((job_id, None, f"{type(e).__name__}: {e}"))
+
+    for shm in slots:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, index, cores, slots):
+        self.index = index
+        self.cores = cores
+        self.slots = slots
+        self.free_slots = list(range(len(slots)))
+        self.inflight = {}
+        self.process = None
+        self.request_conn = None
+        self.ready = False
+        self.restarts = 0
+        self.thread = None
+
+
+class InferencePool:
+    """Pool of YOLO worker processes fed through shared-memory image buffers.
+
+    Each worker is pinned to its own slice of CPU cores and loads `best.pt`
+    once, so model memory grows with the worker count rather than with API
+    traffic. Decoded images are copied into a per-worker shared-memory slot and
+    only the job id and shapes travel over the pipe; the annotated image comes
+    back through the same slot. Jobs go to the ready worker with the fewest
+    jobs in flight; a worker's slots only take jobs once it has loaded the
+    model, and callers wait for a free slot rather than being routed to a
+    worker that is starting or restarting. A worker that dies is restarted with
+    its in-flight jobs failed with InferenceError.
+    """
+
+    def __init__(self, model_path: str, workers: int = None, cores_per_worker: int = None,
+                 slots_per_worker: int = 2, max_side: int = MAX_IMAGE_SIDE, timeout: float = 120.0):
+        if hasattr(os, "sched_getaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+        else:
+            cores = list(range(os.cpu_count() or 1))
+        if workers is None:
+            workers = max(1, len(cores) // (cores_per_worker or 4))
+        if cores_per_worker is None:
+            cores_per_worker = max(1, len(cores) // workers)
+
+        self.model_path = model_path
+        self.num_workers = workers
+        # Contiguous slices; wrap around when workers * cores_per_worker exceeds the cores available
+        self.core_slices = [
+            sorted({cores[(i * cores_per_worker + j) % len(cores)] for j in range(cores_per_worker)})
+            for i in range(workers)
+        ]
+        self.slots_per_worker = slots_per_worker
+        self.max_side = max_side
+        self.slot_bytes = max_side * max_side * 3
+        self.timeout = timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._workers = []
+        self._loop = None
+        # Set whenever a slot is released or a worker becomes ready
+        self._available = None
+        self._closed = False
+
+    def start(self):
+        """Spawn the workers; call from the event loop that will await `infer`"""
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._available = asyncio.Event()
+        for index, cores in enumerate(self.core_slices):
+            slots = [shared_memory.SharedMemory(create=True, size=self.slot_bytes) for _ in range(self.slots_per_worker)]
+            worker = _Worker(index, cores, slots)
+            self._workers.append(worker)
+            # Spawn before returning so every worker has its pipes once start() is done
+            result_conn = self._spawn(worker)
+            worker.thread = threading.Thread(target=self._supervise, args=(worker, result_conn),
+                                             name=f"inference-worker-{index}", daemon=True)
+            worker.thread.start()
+        print(f"Inference pool started: {self.num_workers} workers on cores {self.core_slices}")
+
+    def _spawn(self, worker):
+        request_recv, request_send = self._context.Pipe(duplex=False)
+        result_recv, result_send = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.model_path, worker.cores, [s.name for s in worker.slots], request_recv, result_send),
+            name=f"yolo-worker-{worker.index}",
+            daemon=True
+        )
+        process.start()
+        # Close the child's ends here so EOF is seen when the worker exits
+        request_recv.close()
+        result_send.close()
+        with self._lock:
+            if worker.request_conn is not None:
+                worker.request_conn.close()
+            worker.process = process
+            worker.request_conn = request_send
+        return result_recv
+
+    def _supervise(self, worker, result_conn):
+        """Reader thread: resolve job futures and restart the worker whenever it exits"""
+        while not self._closed:
+            started = time.monotonic()
+            if result_conn is None:
+                result_conn = self._spawn(worker)
+            while True:
+                try:
+                    job_id, detections, error = result_conn.recv()
+                except (EOFError, OSError):
+                    break
+                if job_id == "ready":
+                    with self._lock:
+                        worker.ready = True
+                    print(f"Inference worker {worker.index} ready (pid {worker.process.pid})")
+                    self._loop.call_soon_threadsafe(self._available.set)
+                    continue
+                with self._lock:
+                    future = worker.inflight.pop(job_id, None)
+                if future is not None:
+                    self._loop.call_soon_threadsafe(self._resolve, future, detections, error)
+
+            result_conn.close()
+            result_conn = None
+            worker.process.join(timeout=5)
+            with self._lock:
+                worker.ready = False
+                failed = list(worker.inflight.values())
+                worker.inflight.clear()
+            for future in failed:
+                self._loop.call_soon_threadsafe(self._resolve, future, None, "inference worker exited")
+            if self._closed:
+                break
+            worker.restarts += 1
+            print(f"Inference worker {worker.index} exited with code {worker.process.exitcode}; restarting")
+            # Back off when a worker dies straight away (e.g. the model fails to load)
+            if time.monotonic() - started < 10:
+                time.sleep(min(30, 2 ** min(worker.restarts, 5)))
+
+    @staticmethod
+    def _resolve(future, detections, error):
+        if future.done():
+            return
+        if error:
+            future.set_exception(InferenceError(error))
+        else:
+            future.set_result(detections)
+
+    async def _reserve(self):
+        """Wait for a free slot on a ready worker and take one from the least-loaded"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                candidates = [w for w in self._workers if w.ready and w.free_slots]
+                if candidates:
+                    worker = min(candidates, key=lambda w: len(w.inflight))
+                    return worker, worker.free_slots.pop()
+            if self._closed:
+                raise InferenceError("Inference pool is not running")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise InferenceError(f"No inference worker became available within {self.timeout}s")
+            # Nothing can set the event between the check above and clear(): both run on the loop
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _release(self, worker, slot):
+        with self._lock:
+            worker.free_slots.append(slot)
+        self._available.set()
+
+    def _release_when_done(self, worker, slot, future):
+        """Hand the slot back once the worker has finished with it"""
+        def release(done):
+            if not done.cancelled():
+                # Nobody awaits this job any more; mark a failure as retrieved
+                done.exception()
+            self._release(worker, slot)
+        future.add_done_callback(release)
+
+    def _check_image(self, image):
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        if image.ndim != 3 or image.shape[2] != 3 or image.nbytes > self.slot_bytes:
+            raise InferenceError(f"Unsupported image shape {image.shape}")
+        return image
+
+    async def infer(self, image, annotate: bool = True):
+        """Run YOLO on a BGR uint8 image; return (annotated BGR image, detections).
+
+        With `annotate=False` the worker skips drawing and the image is None.
+        """
+        if not self._workers:
+            raise InferenceError("Inference pool is not running")
+        return (await self._run([self._check_image(image)], annotate))[0]
+
+    async def infer_batch(self, images, annotate: bool = False):
+        """Run YOLO on several images; return a list of (annotated image, detections).
+
+        Images are packed into as few slots as they fit in, and each slot's
+        images reach the model as one batched call.
+        """
+        if not self._workers:
+            raise InferenceError("Inference pool is not running")
+        jobs, job, job_bytes = [], [], 0
+        for image in images:
+            image = self._check_image(image)
+            if job and job_bytes + image.nbytes > self.slot_bytes:
+                jobs.append(job)
+                job, job_bytes = [], 0
+            job.append(image)
+            job_bytes += image.nbytes
+        if job:
+            jobs.append(job)
+        results = await asyncio.gather(*[self._run(job, annotate) for job in jobs])
+        return [item for result in results for item in result]
+
+    async def _run(self, images, annotate: bool):
+        """Run one job: `images` (which fit in one slot together) through one worker"""
+        worker, slot = await self._reserve()
+        future = None
+        try:
+            shapes = [image.shape for image in images]
+            views = _slot_views(worker.slots[slot].buf, shapes)
+            for view, image in zip(views, images):
+                view[...] = image
+            future = self._loop.create_future()
+            job_id = next(self._job_ids)
+            with self._lock:
+                worker.inflight[job_id] = future
+                try:
+                    if worker.request_conn is None:
+                        raise BrokenPipeError("worker process has not been started")
+                    worker.request_conn.send((job_id, slot, shapes, annotate))
+                except (BrokenPipeError, OSError) as e:
+                    worker.inflight.pop(job_id, None)
+                    # The supervisor restarts it; keep new jobs away until it reports ready
+                    worker.ready = False
+                    future.cancel()
+                    raise InferenceError(f"Inference worker unavailable: {e}")
+            try:
+                detections = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                # The worker may still be writing into the slot: kill it and wait
+                # for the supervisor to fail the job before reusing the buffer
+                worker.process.terminate()
+                try:
+                    await future
+                except InferenceError:
+                    pass
+                raise InferenceError(f"Inference timed out after {self.timeout}s")
+            annotated = [view.copy() if annotate else None for view in views]
+            del views
+            return list(zip(annotated, detections))
+        finally:
+            if future is None or future.done():
+                self._release(worker, slot)
+            else:
+                # Cancelled while the worker may still be reading or writing the slot
+                self._release_when_done(worker, slot, future)
+
+    @property
+    def ready_workers(self) -> int:
+        with self._lock:
+            return sum(1 for w in self._workers if w.ready)
+
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "worker": w.index,
+                    "pid": w.process.pid if w.process else None,
+                    "ready": w.ready,
+                    "cores": w.cores,
+                    "inflight": len(w.inflight),
+                    "restarts": w.restarts
+                }
+                for w in self._workers
+            ]
+
+    def close(self):
+        self._closed = True
+        if self._available is not None:
+            # Wake callers waiting for a slot so they fail instead of timing out
+            self._available.set()
+        for worker in self._workers:
+            with self._lock:
+                try:
+                    worker.request_conn.send(None)
+                except (BrokenPipeError, OSError, AttributeError):
+                    pass
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            for shm in worker.slots:
+                shm.close()
+                shm.unlink()
+        self._workers = []
@@ -0,0 +1,217 @@
+"""Scripted load generator for the Billboard Reporting API.
+
+Mixes report submissions, listings, leaderboard, stats and moderation calls
+against a running server and prints throughput and latency percentiles per
+endpoint. Pair it with the offline backend to avoid touching Supabase:
+
+    DATA_BACKEND=local uvicorn main:app --port 8000
+    python load_test.py --base-url http://127.0.0.1:8000 --duration 30 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(__file__), "temp_uploads", "imag2.jpeg")
+DEFAULT_MIX = "submit=1,list=3,user_reports=3,leaderboard=3,stats_by_type=2,user_stats=3,user_rank=2,rollup=1,moderate=1"
+REPORT_TYPES = ['Hazardous', 'Illegal', 'Inappropriate']
+STATUSES = ['under review', 'resolved', 'rejected', 'in progress']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(ACTIONS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {sorted(unknown)}. Choose from {sorted(ACTIONS)}")
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.user_ids = []
+        self.report_ids = []
+        self.etags = {}
+        self.latencies = {}
+        self.errors = {}
+        self.not_modified = {}
+        with open(args.image, 'rb') as f:
+            self.image_bytes = f.read()
+
+    def record(self, name: str, elapsed: float, status_code: int = None):
+        self.latencies.setdefault(name, []).append(elapsed)
+        if status_code is None or status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        elif status_code == 304:
+            self.not_modified[name] = self.not_modified.get(name, 0) + 1
+
+    async def get(self, name: str, url: str, params: dict = None):
+        headers = {}
+        # Query strings select different cached responses, so they need their own ETags
+        key = (url, tuple(sorted((params or {}).items())))
+        if self.args.revalidate and key in self.etags:
+            headers["If-None-Match"] = self.etags[key]
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(url, params=params, headers=headers)
+        except httpx.HTTPError:
+            self.record(name, time.perf_counter() - start)
+            return None
+        self.record(name, time.perf_counter() - start, response.status_code)
+        if "etag" in response.headers:
+            self.etags[key] = response.headers["etag"]
+        return response
+
+    async def setup(self):
+        for _ in range(self.args.users):
+            response = await self.client.post("/create-test-user/")
+            response.raise_for_status()
+            self.user_ids.append(response.json()["user_id"])
+        print(f"Created {len(self.user_ids)} test users")
+
+    async def submit(self):
+        data = {
+            "gps_latitude": str(round(self.rng.uniform(18.9, 19.3), 6)),
+            "gps_longitude": str(round(self.rng.uniform(72.8, 73.0), 6)),
+            "violation_reason": "load test",
+            "report_type": self.rng.choice(REPORT_TYPES),
+            "action_taken": "load test",
+            "user_id": self.rng.choice(self.user_ids)
+        }
+        files = {"image": (os.path.basename(self.args.image), self.image_bytes, "image/jpeg")}
+        start = time.perf_counter()
+        try:
+            response = await self.client.post("/analyze-image/", data=data, files=files,
+                                              timeout=self.args.submit_timeout)
+        except httpx.HTTPError:
+            self.record("submit", time.perf_counter() - start)
+            return
+        self.record("submit", time.perf_counter() - start, response.status_code)
+        if response.status_code == 200:
+            self.report_ids.append(response.json()["report_id"])
+
+    async def moderate(self):
+        if not self.report_ids:
+            return await self.list()
+        report_id = self.rng.choice(self.report_ids)
+        start = time.perf_counter()
+        try:
+            response = await self.client.put(f"/reports/{report_id}/status",
+                                             data={"status": self.rng.choice(STATUSES)})
+        except httpx.HTTPError:
+            self.record("moderate", time.perf_counter() - start)
+            return
+        self.record("moderate", time.perf_counter() - start, response.status_code)
+
+    async def list(self):
+        report_type = self.rng.choice([None] + REPORT_TYPES)
+        await self.get("list", "/reports/", {"report_type": report_type} if report_type else None)
+
+    async def user_reports(self):
+        await self.get("user_reports", f"/reports/user/{self.rng.choice(self.user_ids)}")
+
+    async def leaderboard(self):
+        await self.get("leaderboard", "/leaderboard/")
+
+    async def stats_by_type(self):
+        await self.get("stats_by_type", "/reports/stats/by-type")
+
+    async def user_stats(self):
+        await self.get("user_stats", f"/users/{self.rng.choice(self.user_ids)}/stats")
+
+    async def user_rank(self):
+        await self.get("user_rank", f"/users/{self.rng.choice(self.user_ids)}/rank")
+
+    async def rollup(self):
+        await self.get("rollup", "/reports/rollup", {"granularity": self.rng.choice(["day", "week", "month"])})
+
+    async def worker(self, names, weights, deadline, remaining):
+        while time.perf_counter() < deadline:
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            name = self.rng.choices(names, weights)[0]
+            await ACTIONS[name](self)
+
+    async def run(self, mix: dict):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        remaining = [self.args.requests] if self.args.requests else None
+        start = time.perf_counter()
+        deadline = start + self.args.duration if not self.args.requests else float('inf')
+        await asyncio.gather(*[
+            self.worker(names, weights, deadline, remaining)
+            for _ in range(self.args.concurrency)
+        ])
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float):
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+              f"concurrency {self.args.concurrency}\n")
+        header = f"{'endpoint':<14}{'count':>7}{'req/s':>8}{'errors':>8}{'304s':>6}" \
+                 f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        print(header)
+        print('-' * len(header))
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            print(f"{name:<14}{len(values):>7}{len(values) / elapsed:>8.1f}"
+                  f"{self.errors.get(name, 0):>8}{self.not_modified.get(name, 0):>6}"
+                  f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 90) * 1000:>9.1f}"
+                  f"{percentile(values, 99) * 1000:>9.1f}{values[-1] * 1000:>9.1f}")
+
+
+ACTIONS = {
+    "submit": LoadTest.submit,
+    "moderate": LoadTest.moderate,
+    "list": LoadTest.list,
+    "user_reports": LoadTest.user_reports,
+    "leaderboard": LoadTest.leaderboard,
+    "stats_by_type": LoadTest.stats_by_type,
+    "user_stats": LoadTest.user_stats,
+    "user_rank": LoadTest.user_rank,
+    "rollup": LoadTest.rollup
+}
+
+
+async def main(args):
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        load_test = LoadTest(client, args)
+        await load_test.setup()
+        elapsed = await load_test.run(mix)
+        load_test.report(elapsed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the Billboard Reporting API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    parser.add_argument("--concurrency", type=int, default=20, help="number of concurrent clients")
+    parser.add_argument("--users", type=int, default=10, help="test users to create before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated endpoint=weight pairs")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="image uploaded by submissions")
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match with the last ETag seen per URL and query")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--submit-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from data_access import DataAccessError, IMAGES_BUCKET
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    firebase_uid TEXT,
+    email TEXT,
+    username TEXT,
+    full_name TEXT,
+    phone TEXT,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS reports (
+    report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image_url TEXT,
+    timestamp TEXT,
+    status TEXT,
+    issue TEXT,
+    report_type TEXT,
+    action_taken TEXT,
+    user_id TEXT REFERENCES users(id),
+    gps_latitude REAL,
+    gps_longitude REAL
+);
+CREATE INDEX IF NOT EXISTS reports_user_id ON reports(user_id);
+CREATE INDEX IF NOT EXISTS reports_timestamp ON reports(timestamp);
+"""
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _identifier(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise DataAccessError(f"Invalid column name: {name}", 400)
+    return name
+
+
+class LocalDataAccess:
+    """Local stand-in for SupabaseDataAccess: SQLite tables plus a directory of images.
+
+    Implements the same methods and return shapes (lists of row dicts, public
+    URLs, PostgREST-style `eq`/`gte` filters) so main.py can run offline for
+    development and load testing. Images are served by the API itself from
+    `/local-images`.
+    """
+
+    def __init__(self, db_path: str, storage_dir: str, public_base_url: str):
+        self.db_path = db_path
+        self.storage_dir = os.path.join(storage_dir, IMAGES_BUCKET)
+        self.public_base_url = public_base_url.rstrip('/')
+        self._conn = None
+        self._lock = threading.Lock()
+
+    async def start(self):
+        if self._conn is None:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _run(self, sql: str, params: list, write: bool = False):
+        with self._lock:
+            try:
+                cursor = self._conn.execute(sql, params)
+                rows = [dict(row) for row in cursor.fetchall()]
+                if write:
+                    self._conn.commit()
+                return rows
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                raise DataAccessError(f"{sql.split()[0]} failed: {e}", 400) from e
+
+    async def _execute(self, sql: str, params: list, write: bool = False):
+        await self.start()
+        return await asyncio.to_thread(self._run, sql, params, write)
+
+    @staticmethod
+    def _where(eq: dict = None, gte: dict = None):
+        clauses = []
+        params = []
+        for column, value in (eq or {}).items():
+            clauses.append(f"{_identifier(column)} = ?")
+            params.append(value)
+        for column, value in (gte or {}).items():
+            clauses.append(f"{_identifier(column)} >= ?")
+            params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _columns(columns: str) -> str:
+        if columns.strip() == "*":
+            return "*"
+        return ", ".join(_identifier(c.strip()) for c in columns.split(','))
+
+    async def select(self, table: str, columns: str = "*", eq: dict = None, gte: dict = None,
+                     order: str = None, desc: bool = False, limit: int = None, offset: int = None,
+                     timeout: float = None):
+        where, params = self._where(eq, gte)
+        sql = f"SELECT {self._columns(columns)} FROM {_identifier(table)}{where}"
+        if order:
+            direction = 'DESC' if desc else 'ASC'
+            sql += " ORDER BY " + ", ".join(f"{_identifier(c.strip())} {direction}" for c in order.split(','))
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset or 0]
+        return await self._execute(sql, params)
+
+    async def select_all(self, table: str, columns: str = "*", eq: dict = None, order: str = None,
+                         desc: bool = False, page_size: int = 1000):
+        if not order:
+            raise ValueError("select_all needs an order column to page reliably")
+        return await self.select(table, columns, eq=eq, order=order, desc=desc)
+
+    async def count(self, table: str, eq: dict = None, gte: dict = None, column: str = "*"):
+        where, params = self._where(eq, gte)
+        rows = await self._execute(f"SELECT COUNT(*) AS count FROM {_identifier(table)}{where}", params)
+        return rows[0]["count"]
+
+    async def insert(self, table: str, values: dict):
+        values = dict(values)
+        if table == "users":
+            values.setdefault("id", str(uuid.uuid4()))
+            values.setdefault("created_at", datetime.utcnow().isoformat())
+        columns = [_identifier(c) for c in values]
+        sql = (f"INSERT INTO {_identifier(table)} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)}) RETURNING *")
+        return await self._execute(sql, list(values.values()), write=True)
+
+    async def update(self, table: str, values: dict, eq: dict):
+        where, params = self._where(eq)
+        assignments = ", ".join(f"{_identifier(c)} = ?" for c in values)
+        sql = f"UPDATE {_identifier(table)} SET {assignments}{where} RETURNING *"
+        return await self._execute(sql, list(values.values()) + params, write=True)
+
+    async def delete(self, table: str, eq: dict):
+        where, params = self._where(eq)
+        return await self._execute(f"DELETE FROM {_identifier(table)}{where} RETURNING *", params, write=True)
+
+    def _image_path(self, filename: str) -> str:
+        if os.path.basename(filename) != filename or filename in ('', '.', '..'):
+            raise DataAccessError(f"Invalid image name: {filename}", 400)
+        return os.path.join(self.storage_dir, filename)
+
+    async def list_images(self, page_size: int = 1000):
+        await self.start()
+        names = await asyncio.to_thread(os.listdir, self.storage_dir)
+        return [{"name": name} for name in sorted(names)]
+
+    async def upload_image(self, filename: str, data: bytes, content_type: str = "image/png"):
+        await self.start()
+        path = self._image_path(filename)
+
+        def write():
+            # Exclusive create mirrors Storage rejecting uploads over an existing object
+            try:
+                with open(path, 'xb') as f:
+                    f.write(data)
+            except FileExistsError:
+                raise DataAccessError(f"Image {filename} already exists", 409)
+
+        await asyncio.to_thread(write)
+        return self.public_image_url(filename)
+
+    def public_image_url(self, filename: str) -> str:
+        return f"{self.public_base_url}/local-images/{filename}"
+
+    def image_filename_from_url(self, image_url: str):
+        prefix = f"{self.public_base_url}/local-images/"
+        return image_url[len(prefix):] if image_url.startswith(prefix) else None
+
+    async def remove_images(self, filenames: list):
+        await self.start()
+        removed = []
+        for filename in filenames:
+            path = self._image_path(filename)
+            if os.path.exists(path):
+                await asyncio.to_thread(os.remove, path)
+                removed.append({"name": filename})
+        return removed
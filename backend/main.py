@@ -1,29 +1,54 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import uuid
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
-from ultralytics import YOLO
-import subprocess
+import asyncio
 import glob
 import shutil
 import re
 import tempfile
 import json
+from rollups import ReportRollups, GRANULARITIES, REPORT_STATUSES
+from response_cache import ResponseCache
+from data_access import SupabaseDataAccess, REPORTS_TABLE, USERS_TABLE, is_duplicate_error
+from local_data_access import LocalDataAccess
+from inference_pool import InferencePool, InferenceError, decode_image, save_bgr_image
+from video_analysis import VideoDecodeError, analyze_video, annotate_track, parse_gps_track, interpolate_gps
+from events import EventBroker, GLOBAL_CHANNEL, HEARTBEAT_INTERVAL, user_channel, format_sse, diff_leaderboard
 
 # Load environment
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+# "supabase" (default) or "local" for the offline SQLite + filesystem stand-in
+DATA_BACKEND = os.getenv("DATA_BACKEND", "supabase").lower()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # print(SUPABASE_KEY," ", SUPABASE_URL)
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Supabase credentials not loaded. Check your .env file and restart your server.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Async, pooled access to the reports/users tables and the images bucket
+if DATA_BACKEND == "local":
+    local_data_dir = os.getenv("LOCAL_DATA_DIR", os.path.join(os.path.dirname(__file__), "local_data"))
+    db = LocalDataAccess(
+        os.path.join(local_data_dir, "skyscan.db"),
+        os.path.join(local_data_dir, "storage"),
+        os.getenv("LOCAL_PUBLIC_URL", "http://127.0.0.1:8000")
+    )
+elif DATA_BACKEND == "supabase":
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("Supabase credentials not loaded. Check your .env file and restart your server.")
+    db = SupabaseDataAccess(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "50")),
+        timeout=float(os.getenv("SUPABASE_TIMEOUT", "15")),
+        max_concurrency=int(os.getenv("SUPABASE_MAX_CONCURRENCY", "32"))
+    )
+else:
+    raise RuntimeError(f"Unknown DATA_BACKEND '{DATA_BACKEND}'. Use 'supabase' or 'local'.")
 
 app = FastAPI()
 
@@ -50,15 +75,96 @@ os.makedirs(temp_uploads_dir, exist_ok=True)
 # Mount static directory (keep for local development/testing)
 app.mount("/croppedresult", StaticFiles(directory=croppedresult_dir), name="croppedresult")
 
-# Load YOLO model
+# Serve the local stand-in's images bucket
+if DATA_BACKEND == "local":
+    os.makedirs(db.storage_dir, exist_ok=True)
+    app.mount("/local-images", StaticFiles(directory=db.storage_dir), name="local-images")
+
+# YOLO runs in a pool of worker processes, each loading the model once
 MODEL_PATH = os.path.join(backend_dir, '..', 'best.pt')
-model = YOLO(MODEL_PATH)
+inference_pool = InferencePool(
+    MODEL_PATH,
+    workers=int(os.getenv("INFERENCE_WORKERS")) if os.getenv("INFERENCE_WORKERS") else None,
+    cores_per_worker=int(os.getenv("INFERENCE_CORES_PER_WORKER", "4")),
+    timeout=float(os.getenv("INFERENCE_TIMEOUT", "120"))
+)
+
+# Video uploads are streamed to disk and analysed a batch of sampled frames at a time
+VIDEO_CHUNK_BYTES = 1024 * 1024
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_MB", "1024")) * 1024 * 1024
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+# Sampled frames are downscaled to this side (YOLO runs at 640) so several share one worker slot
+VIDEO_MAX_SIDE = int(os.getenv("VIDEO_MAX_SIDE", "1280"))
+
+# Per-day/week/month report counters backing /reports/rollup, rebuilt from history once
+# older than ROLLUP_MAX_AGE seconds to pick up reports changed directly in Supabase
+report_rollups = ReportRollups(max_age=float(os.getenv("ROLLUP_MAX_AGE", "300")))
+
+async def fetch_rollup_history_page(after_report_id: int, limit: int):
+    """Fetch the next page of report history (by report_id) for the rollup backfill"""
+    gte = {"report_id": after_report_id + 1} if after_report_id is not None else None
+    return await db.select(REPORTS_TABLE, "report_id, timestamp, report_type, status", gte=gte,
+                           order="report_id", limit=limit)
+
+async def backfill_report_rollups():
+    """Load report rollups from history, logging instead of failing on errors"""
+    try:
+        loaded = await report_rollups.backfill(fetch_rollup_history_page)
+        print(f"Report rollups backfilled from {loaded} reports")
+    except Exception as e:
+        print(f"Error backfilling report rollups: {e}")
+
+async def refresh_report_rollups():
+    """Rebuild report rollups if they are missing or stale, logging instead of failing on errors"""
+    try:
+        loaded = await report_rollups.refresh(fetch_rollup_history_page)
+        if loaded is not None:
+            print(f"Report rollups refreshed from {loaded} reports")
+    except Exception as e:
+        print(f"Error refreshing report rollups: {e}")
+
+# Cached read endpoints; invalidated by `response_cache.bump()` on every report/user write
+CACHE_TTLS = {
+    "leaderboard": 30,
+    "user_rank": 30,
+    "reports": 10,
+    "report_stats_by_type": 30,
+    "user_stats": 15,
+    "user_reports": 10
+}
+response_cache = ResponseCache(ttls=CACHE_TTLS)
+
+# Pub/sub for report and leaderboard changes, streamed over /events/stream and /events/ws
+event_broker = EventBroker()
+leaderboard_dirty = asyncio.Event()
+LEADERBOARD_PUBLISH_DELAY = float(os.getenv("LEADERBOARD_PUBLISH_DELAY", "2"))
+background_tasks = []
+
+def publish_report_event(event_type: str, user_id: str, data: dict):
+    """Publish a report change once to the global channel and the owner's channel"""
+    channels = [GLOBAL_CHANNEL, user_channel(user_id)] if user_id else [GLOBAL_CHANNEL]
+    event_broker.publish(channels, event_type, data)
+    leaderboard_dirty.set()
+
+@app.on_event("startup")
+async def startup():
+    inference_pool.start()
+    await db.start()
+    await backfill_report_rollups()
+    background_tasks.append(asyncio.create_task(publish_leaderboard_changes()))
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    inference_pool.close()
+    await db.close()
 
-def get_next_billboard_number():
+async def get_next_billboard_number():
     """Get the next billboard number for sequential naming"""
     try:
         # Check Supabase storage for existing files
-        result = supabase.storage.from_('images').list()
+        result = await db.list_images()
         if not result:
             return 1
         
@@ -93,29 +199,30 @@ def get_next_billboard_number():
         except:
             return 1
 
-def upload_image_to_supabase(file_path: str, filename: str) -> str:
+def read_file_bytes(file_path: str) -> bytes:
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def write_file_bytes(file_path: str, data: bytes):
+    with open(file_path, 'wb') as f:
+        f.write(data)
+
+async def upload_image_to_supabase(file_path: str, filename: str) -> str:
     """Upload image to Supabase Storage and return public URL"""
     try:
         print(f"Attempting to upload {filename} to Supabase Storage...")
         
-        # Read the file
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
+        # Read the file off the event loop
+        file_data = await asyncio.to_thread(read_file_bytes, file_path)
         
         print(f"File size: {len(file_data)} bytes")
         
         # Upload to Supabase Storage
         try:
-            result = supabase.storage.from_('images').upload(filename, file_data)
-            print(f"Upload result: {result}")
-            
-            if result:
-                # Get public URL
-                public_url = supabase.storage.from_('images').get_public_url(filename)
-                print(f"Image uploaded successfully. Public URL: {public_url}")
-                return public_url
-            else:
-                raise Exception("Upload result was None or empty")
+            content_type = "image/jpeg" if filename.lower().endswith(('.jpg', '.jpeg')) else "image/png"
+            public_url = await db.upload_image(filename, file_data, content_type)
+            print(f"Image uploaded successfully. Public URL: {public_url}")
+            return public_url
                 
         except Exception as upload_error:
             print(f"Detailed upload error: {upload_error}")
@@ -129,6 +236,45 @@ def upload_image_to_supabase(file_path: str, filename: str) -> str:
         traceback.print_exc()
         raise e
 
+# Highest billboard number handed out by this process, so concurrent submissions don't pick the same one
+last_billboard_number = 0
+BILLBOARD_UPLOAD_ATTEMPTS = 5
+
+async def upload_billboard_image(vis_path: str):
+    """Upload an annotated image as the next free billboardN.png; return (number, public URL).
+
+    The bucket listing and the upload are separate awaits, so another submission
+    (in this or another process) can claim the same number in between. Numbers
+    are reserved locally before uploading, and a duplicate-name rejection moves
+    on to the next number.
+    """
+    global last_billboard_number
+    number = await get_next_billboard_number()
+    for attempt in range(BILLBOARD_UPLOAD_ATTEMPTS):
+        number = max(number, last_billboard_number + 1)
+        last_billboard_number = number
+        filename = f"billboard{number}.png"
+        try:
+            return number, await upload_image_to_supabase(vis_path, filename)
+        except Exception as e:
+            if not is_duplicate_error(e) or attempt == BILLBOARD_UPLOAD_ATTEMPTS - 1:
+                raise
+            print(f"{filename} already exists, trying the next number")
+            number += 1
+
+async def insert_report(report_data: dict):
+    """Insert a new report and update rollups, cached responses and subscribers; return its report_id"""
+    # Insert into Supabase - let report_id auto-increment; the inserted row is returned
+    inserted = await db.insert(REPORTS_TABLE, report_data)
+    response_cache.bump()
+
+    if not inserted:
+        raise HTTPException(status_code=500, detail="Failed to retrieve report ID after insert")
+    report_rollups.record_insert(report_data["timestamp"], report_data["report_type"], report_data["status"],
+                                 inserted[0]["report_id"])
+    publish_report_event("report_created", report_data["user_id"], {"report": inserted[0]})
+    return inserted[0]["report_id"]
+
 @app.post("/analyze-image/")
 async def analyze_image(
     image: UploadFile = File(...),
@@ -147,8 +293,8 @@ async def analyze_image(
         try:
             validated_uuid = str(uuid.UUID(user_id))
             # Check if user exists in database
-            user_check = supabase.table("users").select("id").eq("id", validated_uuid).execute()
-            if not user_check.data:
+            user_check = await db.select(USERS_TABLE, "id", eq={"id": validated_uuid})
+            if not user_check:
                 raise HTTPException(status_code=400, detail="User not found")
             print(f"Valid user confirmed: {validated_uuid}")
         except ValueError:
@@ -159,34 +305,24 @@ async def analyze_image(
         if report_type not in valid_report_types:
             raise HTTPException(status_code=400, detail=f"Invalid report type. Must be one of: {valid_report_types}")
 
-        # Save uploaded image temporarily
-        temp_path = os.path.join(temp_uploads_dir, f"temp_{uuid.uuid4()}{os.path.splitext(image.filename)[1]}")
-        with open(temp_path, "wb") as f:
-            f.write(await image.read())
+        # Decode the upload in memory
+        try:
+            decoded = await asyncio.to_thread(decode_image, await image.read())
+        except Exception as decode_error:
+            print(f"Could not decode uploaded image: {decode_error}")
+            raise HTTPException(status_code=400, detail="Invalid image file")
+
+        # Process image with YOLO on the inference pool
+        annotated, detections = await inference_pool.infer(decoded)
+        print(f"YOLO found {len(detections)} detections")
 
-        # Process image with YOLO
         with tempfile.TemporaryDirectory() as temp_output_dir:
             vis_path = os.path.join(temp_output_dir, "billboard_vis.png")
-            subprocess.run([
-                "python", "-c",
-                (
-                    "from ultralytics import YOLO; "
-                    "import sys; "
-                    "from PIL import Image; "
-                    "model=YOLO(r'{}'); "
-                    "results=model(r'{}'); "
-                    "im=results[0].plot(); "
-                    "Image.fromarray(im).save(r'{}')"
-                ).format(MODEL_PATH.replace('\\', '\\\\'), temp_path.replace('\\', '\\\\'), vis_path.replace('\\', '\\\\'))
-            ], check=True)
-
-            # Generate filename for storage
-            next_billboard_num = get_next_billboard_number()
-            filename = f"billboard{next_billboard_num}.png"
-
-            # Upload to Supabase Storage images bucket
+            await asyncio.to_thread(save_bgr_image, annotated, vis_path)
+
+            # Upload to Supabase Storage images bucket under the next billboard number
             try:
-                public_url = upload_image_to_supabase(vis_path, filename)
+                next_billboard_num, public_url = await upload_billboard_image(vis_path)
                 print(f"Image uploaded to Supabase Storage: {public_url}")
             except Exception as upload_error:
                 print(f"Failed to upload to Supabase: {upload_error}")
@@ -218,26 +354,7 @@ async def analyze_image(
         if lng is not None:
             report_data["gps_longitude"] = lng
 
-        # Insert into Supabase - let report_id auto-increment
-        insert_result = supabase.table("reports").insert(report_data).execute()
-
-        # Fetch the latest report for this user (should be the one just inserted)
-        fetch_result = supabase.table("reports") \
-            .select("report_id") \
-            .eq("user_id", validated_uuid) \
-            .order("timestamp", desc=True) \
-            .limit(1) \
-            .execute()
-
-        if fetch_result.data:
-            report_id = fetch_result.data[0]["report_id"]
-        else:
-            raise HTTPException(status_code=500, detail="Failed to retrieve report ID after insert")
-
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-            print(f"Cleaned up temporary file: {temp_path}")
+        report_id = await insert_report(report_data)
 
         response_data = {
             "report_id": report_id,
@@ -251,6 +368,7 @@ async def analyze_image(
             "report_type": report_type,  # Include in response
             "action_taken": action_taken,  # Include in response
             "user_id": validated_uuid,
+            "detections": detections,
             "message": "Report submitted successfully"
         }
 
@@ -259,9 +377,9 @@ async def analyze_image(
 
     except HTTPException:
         raise
-    except subprocess.CalledProcessError as e:
+    except InferenceError as e:
         error_msg = f"YOLO processing failed: {str(e)}"
-        print(f"Subprocess error: {error_msg}")
+        print(f"Inference error: {error_msg}")
         return JSONResponse(content={"error": error_msg}, status_code=500)
     except Exception as e:
         error_msg = f"Server error: {str(e)}"
@@ -270,6 +388,145 @@ async def analyze_image(
         traceback.print_exc()
         return JSONResponse(content={"error": error_msg}, status_code=500)
 
+# NEW: Analyze a dashcam clip and file one report per distinct billboard
+@app.post("/analyze-video/")
+async def analyze_video_clip(
+    video: UploadFile = File(...),
+    gps_track: str = Form(""),  # JSON list of {"t": seconds into clip, "lat": .., "lng": ..}
+    gps_latitude: str = Form(""),  # Used when no GPS track is sent
+    gps_longitude: str = Form(""),
+    violation_reason: str = Form(...),
+    report_type: str = Form(...),
+    action_taken: str = Form(...),
+    user_id: str = Form(...)
+):
+    temp_path = None
+    billboards = []
+    failed_billboards = []
+    try:
+        print(f"Received video for user: {user_id}")
+
+        # Validate user_id format and existence
+        try:
+            validated_uuid = str(uuid.UUID(user_id))
+            user_check = await db.select(USERS_TABLE, "id", eq={"id": validated_uuid})
+            if not user_check:
+                raise HTTPException(status_code=400, detail="User not found")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid user ID format")
+
+        valid_report_types = ['Hazardous', 'Illegal', 'Inappropriate']
+        if report_type not in valid_report_types:
+            raise HTTPException(status_code=400, detail=f"Invalid report type. Must be one of: {valid_report_types}")
+
+        try:
+            track_points = parse_gps_track(gps_track)
+            fixed_lat = float(gps_latitude) if gps_latitude.strip() else None
+            fixed_lng = float(gps_longitude) if gps_longitude.strip() else None
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid GPS data: {e}")
+
+        # Stream the upload to disk in chunks so the clip never sits in memory
+        temp_path = os.path.join(temp_uploads_dir, f"video_{uuid.uuid4()}{os.path.splitext(video.filename or '')[1] or '.mp4'}")
+        size = 0
+        with open(temp_path, "wb") as f:
+            while True:
+                chunk = await video.read(VIDEO_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_VIDEO_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Video larger than {MAX_VIDEO_BYTES // (1024 * 1024)} MB")
+                await asyncio.to_thread(f.write, chunk)
+        print(f"Saved video ({size} bytes) to {temp_path}")
+
+        async def file_billboard_report(track):
+            # A failure filing one billboard must not lose the reports already filed
+            try:
+                if track_points:
+                    lat, lng = interpolate_gps(track_points, track.best_t)
+                else:
+                    lat, lng = fixed_lat, fixed_lng
+
+                with tempfile.TemporaryDirectory() as temp_output_dir:
+                    vis_path = os.path.join(temp_output_dir, "billboard_vis.png")
+                    await asyncio.to_thread(save_bgr_image, annotate_track(track), vis_path)
+                    next_billboard_num, public_url = await upload_billboard_image(vis_path)
+
+                timestamp = datetime.utcnow().isoformat()
+                report_data = {
+                    "image_url": public_url,
+                    "timestamp": timestamp,
+                    "status": "under review",
+                    "issue": violation_reason,
+                    "report_type": report_type,
+                    "action_taken": action_taken,
+                    "user_id": validated_uuid
+                }
+                if lat is not None:
+                    report_data["gps_latitude"] = lat
+                if lng is not None:
+                    report_data["gps_longitude"] = lng
+
+                report_id = await insert_report(report_data)
+                billboards.append({
+                    "report_id": report_id,
+                    "image_url": public_url,
+                    "billboard_number": next_billboard_num,
+                    "gps_latitude": lat,
+                    "gps_longitude": lng,
+                    "timestamp": timestamp,
+                    "track": track.summary()
+                })
+                print(f"Filed report {report_id} for billboard track {track.id}")
+            except Exception as e:
+                print(f"Error filing report for billboard track {track.id}: {e}")
+                failed_billboards.append({"track": track.summary(), "error": str(e)})
+
+        try:
+            stats = await analyze_video(
+                temp_path,
+                lambda frames: inference_pool.infer_batch(frames, annotate=False),
+                file_billboard_report,
+                batch_size=VIDEO_BATCH_SIZE,
+                max_side=VIDEO_MAX_SIDE
+            )
+        except VideoDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Could not decode video: {e}")
+
+        message = f"{len(billboards)} billboard report(s) submitted successfully"
+        if failed_billboards:
+            message += f"; {len(failed_billboards)} could not be filed"
+        return JSONResponse(content={
+            "user_id": validated_uuid,
+            "total_frames": stats.get("frames", 0),
+            "analyzed_frames": stats.get("sampled", 0),
+            "fps": stats.get("fps"),
+            "total_billboards": len(billboards),
+            "billboards": billboards,
+            "failed_billboards": failed_billboards,
+            "message": message
+        })
+
+    except HTTPException:
+        raise
+    # Reports filed before the failure stay in the database, so list them in the error too
+    except InferenceError as e:
+        error_msg = f"YOLO processing failed: {str(e)}"
+        print(f"Inference error: {error_msg}")
+        return JSONResponse(content={"error": error_msg, "billboards": billboards,
+                                     "failed_billboards": failed_billboards}, status_code=500)
+    except Exception as e:
+        error_msg = f"Server error: {str(e)}"
+        print(f"General error: {error_msg}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(content={"error": error_msg, "billboards": billboards,
+                                     "failed_billboards": failed_billboards}, status_code=500)
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
 # Test endpoint to create a dummy user (for testing)
 @app.post("/create-test-user/")
 async def create_test_user():
@@ -282,11 +539,12 @@ async def create_test_user():
             "phone": "+1234567890"
         }
         
-        result = supabase.table("users").insert(test_user_data).execute()
+        result = await db.insert(USERS_TABLE, test_user_data)
+        response_cache.bump()
         return JSONResponse(content={
             "message": "Test user created successfully",
-            "user_id": result.data[0]["id"] if result.data else None,
-            "user_data": result.data[0] if result.data else None
+            "user_id": result[0]["id"] if result else None,
+            "user_data": result[0] if result else None
         })
     except Exception as e:
         return JSONResponse(content={"error": f"Failed to create test user: {str(e)}"}, status_code=500)
@@ -303,9 +561,9 @@ async def verify_user(user_id: str):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid user ID format")
         # Check if user exists
-        result = supabase.table("users").select("id, username, full_name, email").eq("id", validated_uuid).execute()
-        if result.data:
-            user_data = result.data[0]
+        result = await db.select(USERS_TABLE, "id, username, full_name, email", eq={"id": validated_uuid})
+        if result:
+            user_data = result[0]
             return JSONResponse(content={
                 "exists": True,
                 "user_data": user_data,
@@ -324,8 +582,11 @@ async def verify_user(user_id: str):
 
 # Get user statistics with report type breakdown
 @app.get("/users/{user_id}/stats")
-async def get_user_stats(user_id: str):
+async def get_user_stats(user_id: str, request: Request):
     """Get report statistics for a specific user including report type breakdown"""
+    return await response_cache.respond(request, "user_stats", {"user_id": user_id}, lambda: build_user_stats(user_id))
+
+async def build_user_stats(user_id: str):
     try:
         print(f"Getting stats for user: {user_id}")
         # Validate UUID format
@@ -334,8 +595,9 @@ async def get_user_stats(user_id: str):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid user ID format")
         # Get all reports for the user
-        reports_result = supabase.table("reports").select("status, report_type").eq("user_id", validated_uuid).execute()
-        if not reports_result.data:
+        reports_result = await db.select_all(REPORTS_TABLE, "status, report_type", eq={"user_id": validated_uuid},
+                                             order="report_id")
+        if not reports_result:
             return JSONResponse(content={
                 "user_id": validated_uuid,
                 "total_reports": 0,
@@ -344,7 +606,7 @@ async def get_user_stats(user_id: str):
             })
         # Calculate status statistics
         status_stats = {
-            "total": len(reports_result.data),
+            "total": len(reports_result),
             "under review": 0,
             "resolved": 0,
             "rejected": 0,
@@ -358,7 +620,7 @@ async def get_user_stats(user_id: str):
             "Inappropriate": 0
         }
         
-        for report in reports_result.data:
+        for report in reports_result:
             # Count by status
             status = report.get('status', '').lower()
             if status in status_stats:
@@ -383,7 +645,10 @@ async def get_user_stats(user_id: str):
 
 # Updated get user reports endpoint with report type and action taken
 @app.get("/reports/user/{user_id}")
-async def get_user_reports(user_id: str):
+async def get_user_reports(user_id: str, request: Request):
+    return await response_cache.respond(request, "user_reports", {"user_id": user_id}, lambda: build_user_reports(user_id))
+
+async def build_user_reports(user_id: str):
     try:
         print(f"Fetching reports for user_id: {user_id}")
         # Validate UUID format
@@ -392,16 +657,16 @@ async def get_user_reports(user_id: str):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid user ID format")
         # Verify user exists first
-        user_check = supabase.table("users").select("id").eq("id", validated_uuid).execute()
-        if not user_check.data:
+        user_check = await db.select(USERS_TABLE, "id", eq={"id": validated_uuid})
+        if not user_check:
             raise HTTPException(status_code=404, detail="User not found")
         # Get reports for the user
-        result = supabase.table("reports").select("*").eq("user_id", validated_uuid).order("timestamp", desc=True).execute()
-        print(f"Found {len(result.data)} reports for user {validated_uuid}")
+        result = await db.select_all(REPORTS_TABLE, "*", eq={"user_id": validated_uuid}, order="timestamp,report_id", desc=True)
+        print(f"Found {len(result)} reports for user {validated_uuid}")
         return JSONResponse(content={
             "user_id": validated_uuid,
-            "total_reports": len(result.data),
-            "reports": result.data
+            "total_reports": len(result),
+            "reports": result
         })
     except HTTPException:
         raise
@@ -415,10 +680,14 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Test database connection
-        test_result = supabase.table("users").select("count").limit(1).execute()
+        test_result = await db.select(USERS_TABLE, "id", limit=1, timeout=5.0)
+        # Reads still work without YOLO, but image and video analysis do not
+        inference_ready = inference_pool.ready_workers > 0
         return JSONResponse(content={
-            "status": "healthy",
+            "status": "healthy" if inference_ready else "degraded",
             "database": "connected",
+            "inference": "ready" if inference_ready else "unavailable",
+            "inference_workers": inference_pool.stats(),
             "timestamp": datetime.utcnow().isoformat()
         })
     except Exception as e:
@@ -431,22 +700,28 @@ async def health_check():
 
 # Get all reports endpoint with report type filtering
 @app.get("/reports/")
-async def get_reports(report_type: str = None):
+async def get_reports(request: Request, report_type: str = None):
+    return await response_cache.respond(request, "reports", {"report_type": report_type}, lambda: build_reports(report_type))
+
+async def build_reports(report_type: str = None):
     try:
-        query = supabase.table("reports").select("*")
+        filters = {}
         if report_type and report_type in ['Hazardous', 'Illegal', 'Inappropriate']:
-            query = query.eq("report_type", report_type)
-        result = query.order("timestamp", desc=True).execute()
-        return JSONResponse(content={"reports": result.data})
+            filters["report_type"] = report_type
+        result = await db.select_all(REPORTS_TABLE, "*", eq=filters, order="timestamp,report_id", desc=True)
+        return JSONResponse(content={"reports": result})
     except Exception as e:
         return JSONResponse(content={"error": f"Failed to fetch reports: {str(e)}"}, status_code=500)
 
 # Get report statistics by type
 @app.get("/reports/stats/by-type")
-async def get_report_stats_by_type():
+async def get_report_stats_by_type(request: Request):
     """Get report statistics broken down by report type"""
+    return await response_cache.respond(request, "report_stats_by_type", {}, build_report_stats_by_type)
+
+async def build_report_stats_by_type():
     try:
-        result = supabase.table("reports").select("report_type, status").execute()
+        result = await db.select_all(REPORTS_TABLE, "report_type, status", order="report_id")
         
         stats = {
             "Hazardous": {"total": 0, "under review": 0, "resolved": 0, "rejected": 0, "in progress": 0},
@@ -454,7 +729,7 @@ async def get_report_stats_by_type():
             "Inappropriate": {"total": 0, "under review": 0, "resolved": 0, "rejected": 0, "in progress": 0}
         }
         
-        for report in result.data:
+        for report in result:
             report_type = report.get('report_type', '')
             status = report.get('status', '').lower()
             
@@ -474,31 +749,39 @@ async def delete_report(report_id: str):
         print(f"Attempting to delete report: {report_id}")
         
         # First, check if the report exists and get its details
-        check_result = supabase.table("reports").select("*").eq("report_id", report_id).execute()
+        check_result = await db.select(REPORTS_TABLE, "*", eq={"report_id": report_id})
         
-        if not check_result.data:
+        if not check_result:
             raise HTTPException(status_code=404, detail="Report not found")
         
-        report = check_result.data[0]
+        report = check_result[0]
         
         # Optional: Delete the image from Supabase Storage if needed
         # You might want to add user authorization here to ensure users can only delete their own reports
-        image_url = report.get('image_url', '')
-        if 'supabase' in image_url:
+        filename = db.image_filename_from_url(report.get('image_url') or '')
+        if filename:
             try:
-                # Extract filename from URL to delete from storage
-                filename = image_url.split('/')[-1]
-                supabase.storage.from_('images').remove([filename])
+                await db.remove_images([filename])
                 print(f"Deleted image from storage: {filename}")
             except Exception as img_del_error:
                 print(f"Could not delete image from storage: {img_del_error}")
                 # Continue with report deletion even if image deletion fails
         
         # Delete the report from the database
-        delete_result = supabase.table("reports").delete().eq("report_id", report_id).execute()
+        delete_result = await db.delete(REPORTS_TABLE, eq={"report_id": report_id})
         
-        if delete_result.data:
+        if delete_result:
             print(f"Successfully deleted report: {report_id}")
+            if report.get('timestamp'):
+                report_rollups.record_delete(report['timestamp'], report.get('report_type'), report.get('status'),
+                                             report.get('report_id'))
+            response_cache.bump()
+            publish_report_event("report_deleted", report.get('user_id'), {
+                "report_id": report.get('report_id', report_id),
+                "user_id": report.get('user_id'),
+                "status": report.get('status'),
+                "report_type": report.get('report_type')
+            })
             return JSONResponse(content={
                 "message": "Report deleted successfully",
                 "deleted_report_id": report_id
@@ -521,28 +804,37 @@ async def delete_user_report(report_id: str, user_id: str):
         print(f"Attempting to delete report {report_id} for user {user_id}")
         
         # Check if the report exists and belongs to the user
-        check_result = supabase.table("reports").select("*").eq("report_id", report_id).eq("user_id", user_id).execute()
+        check_result = await db.select(REPORTS_TABLE, "*", eq={"report_id": report_id, "user_id": user_id})
         
-        if not check_result.data:
+        if not check_result:
             raise HTTPException(status_code=404, detail="Report not found or you don't have permission to delete it")
         
-        report = check_result.data[0]
+        report = check_result[0]
         
         # Delete the image from Supabase Storage if needed
-        image_url = report.get('image_url', '')
-        if 'supabase' in image_url:
+        filename = db.image_filename_from_url(report.get('image_url') or '')
+        if filename:
             try:
-                filename = image_url.split('/')[-1]
-                supabase.storage.from_('images').remove([filename])
+                await db.remove_images([filename])
                 print(f"Deleted image from storage: {filename}")
             except Exception as img_del_error:
                 print(f"Could not delete image from storage: {img_del_error}")
         
         # Delete the report from the database
-        delete_result = supabase.table("reports").delete().eq("report_id", report_id).eq("user_id", user_id).execute()
+        delete_result = await db.delete(REPORTS_TABLE, eq={"report_id": report_id, "user_id": user_id})
         
-        if delete_result.data:
+        if delete_result:
             print(f"Successfully deleted report: {report_id}")
+            if report.get('timestamp'):
+                report_rollups.record_delete(report['timestamp'], report.get('report_type'), report.get('status'),
+                                             report.get('report_id'))
+            response_cache.bump()
+            publish_report_event("report_deleted", report.get('user_id'), {
+                "report_id": report.get('report_id', report_id),
+                "user_id": report.get('user_id'),
+                "status": report.get('status'),
+                "report_type": report.get('report_type')
+            })
             return JSONResponse(content={
                 "message": "Report deleted successfully",
                 "deleted_report_id": report_id
@@ -564,12 +856,11 @@ async def test_upload(image: UploadFile = File(...)):
     try:
         # Save uploaded image temporarily
         temp_path = os.path.join(temp_uploads_dir, image.filename)
-        with open(temp_path, "wb") as f:
-            f.write(await image.read())
+        await asyncio.to_thread(write_file_bytes, temp_path, await image.read())
         
         # Upload to Supabase Storage
         filename = f"test_{uuid.uuid4()}{os.path.splitext(image.filename)[1]}"
-        public_url = upload_image_to_supabase(temp_path, filename)
+        public_url = await upload_image_to_supabase(temp_path, filename)
         
         # Clean up
         os.remove(temp_path)
@@ -593,24 +884,67 @@ async def get_monthly_report_count():
     try:
         now = datetime.utcnow()
         start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        result = supabase.table("reports") \
-            .select("report_id", count="exact") \
-            .gte("timestamp", start_of_month.isoformat()) \
-            .execute()
-        return {"count": result.count or 0}
+        count = await db.count(REPORTS_TABLE, gte={"timestamp": start_of_month.isoformat()}, column="report_id")
+        return {"count": count}
     except Exception as e:
         return {"count": 0, "error": str(e)}
 
+# NEW: Report histogram over an arbitrary date range
+@app.get("/reports/rollup")
+async def get_report_rollup(
+    start: str = None,
+    end: str = None,
+    granularity: str = "day",
+    report_type: str = None,
+    status: str = None
+):
+    """Get report counts per day, week or month between start and end (inclusive, UTC dates)"""
+    try:
+        try:
+            end_day = date.fromisoformat(end) if end else datetime.utcnow().date()
+            start_day = date.fromisoformat(start) if start else end_day - timedelta(days=29)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+        if granularity not in GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"Invalid granularity. Must be one of: {GRANULARITIES}")
+        if report_type and report_type not in ['Hazardous', 'Illegal', 'Inappropriate']:
+            raise HTTPException(status_code=400, detail="Invalid report type. Must be one of: ['Hazardous', 'Illegal', 'Inappropriate']")
+        if status and status.lower() not in REPORT_STATUSES:
+            raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {REPORT_STATUSES}")
+
+        if report_rollups.stale:
+            # A failed refresh of loaded counters still serves them; only missing ones are a 503
+            await refresh_report_rollups()
+            if not report_rollups.loaded:
+                raise HTTPException(status_code=503, detail="Report rollups are not available yet")
+
+        try:
+            buckets = report_rollups.histogram(start_day, end_day, granularity, report_type, status.lower() if status else None)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return JSONResponse(content={
+            "start": start_day.isoformat(),
+            "end": end_day.isoformat(),
+            "granularity": granularity,
+            "report_type": report_type,
+            "status": status.lower() if status else None,
+            "total": sum(b["total"] for b in buckets),
+            "buckets": buckets
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error getting report rollup: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get report rollup: {str(e)}")
+
 # NEW: Get count of reports with status 'resolved'
 @app.get("/reports/count/resolved")
 async def get_resolved_report_count():
     """Get count of reports with status 'resolved'"""
     try:
-        result = supabase.table("reports") \
-            .select("report_id", count="exact") \
-            .eq("status", "resolved") \
-            .execute()
-        return {"count": result.count or 0}
+        count = await db.count(REPORTS_TABLE, eq={"status": "resolved"}, column="report_id")
+        return {"count": count}
     except Exception as e:
         return {"count": 0, "error": str(e)}
 
@@ -628,30 +962,41 @@ def calculate_user_points(user_reports):
 
 # NEW: Get leaderboard data
 @app.get("/leaderboard/")
-async def get_leaderboard():
+async def get_leaderboard(request: Request):
     """Get leaderboard with user rankings based on points from resolved/rejected reports"""
+    return await response_cache.respond(request, "leaderboard", {}, build_leaderboard)
+
+async def build_leaderboard():
     try:
         # Get all users
-        users_result = supabase.table("users").select("id, username, full_name").execute()
-        if not users_result.data:
+        users_result, all_reports = await asyncio.gather(
+            db.select_all(USERS_TABLE, "id, username, full_name", order="id"),
+            db.select_all(REPORTS_TABLE, "user_id, status", order="report_id")
+        )
+        if not users_result:
             return JSONResponse(content={"leaderboard": []})
         
+        # Group report statuses by user in one pass instead of one query per user
+        reports_by_user = {}
+        for report in all_reports:
+            reports_by_user.setdefault(report.get('user_id'), []).append(report)
+        
         leaderboard_data = []
         
-        for user in users_result.data:
+        for user in users_result:
             user_id = user['id']
             username = user.get('username', user.get('full_name', 'Unknown User'))
             
             # Get all reports for this user
-            reports_result = supabase.table("reports").select("status").eq("user_id", user_id).execute()
+            user_reports = reports_by_user.get(user_id, [])
             
             # Calculate points
-            points = calculate_user_points(reports_result.data)
+            points = calculate_user_points(user_reports)
             
             # Count total reports
-            total_reports = len(reports_result.data)
-            resolved_reports = len([r for r in reports_result.data if r.get('status', '').lower() == 'resolved'])
-            rejected_reports = len([r for r in reports_result.data if r.get('status', '').lower() == 'rejected'])
+            total_reports = len(user_reports)
+            resolved_reports = len([r for r in user_reports if r.get('status', '').lower() == 'resolved'])
+            rejected_reports = len([r for r in user_reports if r.get('status', '').lower() == 'rejected'])
             
             # Only include users with at least some activity
             if total_reports > 0:
@@ -679,8 +1024,11 @@ async def get_leaderboard():
 
 # NEW: Get specific user's rank and points
 @app.get("/users/{user_id}/rank")
-async def get_user_rank(user_id: str):
+async def get_user_rank(user_id: str, request: Request):
     """Get a specific user's rank and points"""
+    return await response_cache.respond(request, "user_rank", {"user_id": user_id}, lambda: build_user_rank(user_id))
+
+async def build_user_rank(user_id: str):
     try:
         # Validate UUID format
         try:
@@ -689,7 +1037,7 @@ async def get_user_rank(user_id: str):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
         
         # Get leaderboard to find user's rank
-        leaderboard_response = await get_leaderboard()
+        leaderboard_response = await response_cache.respond(None, "leaderboard", {}, build_leaderboard)
         leaderboard_content = leaderboard_response.body.decode('utf-8')
         leaderboard_data = json.loads(leaderboard_content)
         
@@ -715,10 +1063,10 @@ async def get_user_rank(user_id: str):
             })
         else:
             # User not in leaderboard (no reports), return default values
-            user_result = supabase.table("users").select("username, full_name").eq("id", validated_uuid).execute()
+            user_result = await db.select(USERS_TABLE, "username, full_name", eq={"id": validated_uuid})
             username = "Unknown User"
-            if user_result.data:
-                username = user_result.data[0].get('username', user_result.data[0].get('full_name', 'Unknown User'))
+            if user_result:
+                username = user_result[0].get('username', user_result[0].get('full_name', 'Unknown User'))
             
             return JSONResponse(content={
                 "user_id": validated_uuid,
@@ -745,10 +1093,25 @@ async def update_report_status(report_id: str, status: str = Form(...)):
         if status.lower() not in valid_statuses:
             raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
         
+        # Read the current row so the rollups can move the report between statuses
+        current = await db.select(REPORTS_TABLE, "report_id, timestamp, report_type, status, user_id", eq={"report_id": report_id})
+        
         # Update the report status
-        result = supabase.table("reports").update({"status": status.lower()}).eq("report_id", report_id).execute()
+        result = await db.update(REPORTS_TABLE, {"status": status.lower()}, eq={"report_id": report_id})
         
-        if result.data:
+        if result:
+            previous = current[0] if current else {}
+            if previous.get('timestamp'):
+                report_rollups.record_status_change(previous['timestamp'], previous.get('report_type'), previous.get('status'),
+                                                    status.lower(), previous.get('report_id'))
+            response_cache.bump()
+            publish_report_event("report_status_changed", result[0].get('user_id'), {
+                "report_id": result[0].get('report_id', report_id),
+                "user_id": result[0].get('user_id'),
+                "report_type": result[0].get('report_type'),
+                "old_status": previous.get('status'),
+                "new_status": status.lower()
+            })
             return JSONResponse(content={
                 "message": "Report status updated successfully",
                 "report_id": report_id,
@@ -761,4 +1124,116 @@ async def update_report_status(report_id: str, status: str = Form(...)):
         raise
     except Exception as e:
         print(f"Error updating report status: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to update report status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to update report status: {str(e)}")
+
+# NEW: Real-time report and leaderboard updates
+async def publish_leaderboard_changes():
+    """Background task: after report writes, publish leaderboard and per-user rank diffs.
+
+    Writes are coalesced for LEADERBOARD_PUBLISH_DELAY seconds. While no client
+    is subscribed the task sleeps and drops its snapshot; the snapshot is
+    rebuilt as soon as someone subscribes, so later diffs are against fresh data.
+    """
+    async def current_leaderboard():
+        response = await response_cache.respond(None, "leaderboard", {}, build_leaderboard)
+        leaderboard_data = json.loads(response.body.decode('utf-8'))
+        if 'error' in leaderboard_data:
+            raise RuntimeError(leaderboard_data['error'])
+        return leaderboard_data['leaderboard']
+
+    snapshot = None
+    while True:
+        if not event_broker.subscriber_count:
+            snapshot = None
+            leaderboard_dirty.clear()
+            await event_broker.wait_for_subscriber()
+        if snapshot is None:
+            try:
+                snapshot, _, _ = diff_leaderboard({}, await current_leaderboard())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error loading leaderboard snapshot: {e}")
+                await asyncio.sleep(LEADERBOARD_PUBLISH_DELAY)
+                continue
+
+        await leaderboard_dirty.wait()
+        await asyncio.sleep(LEADERBOARD_PUBLISH_DELAY)
+        leaderboard_dirty.clear()
+        if not event_broker.subscriber_count:
+            continue
+        try:
+            snapshot, changed, removed = diff_leaderboard(snapshot, await current_leaderboard())
+            if changed or removed:
+                event_broker.publish(GLOBAL_CHANNEL, "leaderboard_changed", {"changed": changed, "removed": removed})
+                for entry in changed:
+                    event_broker.publish(user_channel(entry['user_id']), "rank_changed", entry)
+                for user_id in removed:
+                    event_broker.publish(user_channel(user_id), "rank_changed", {"user_id": user_id, "rank": None, "points": 0})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error publishing leaderboard changes: {e}")
+
+def event_channels(user_id: str = None, include_global: bool = True):
+    """Channels for a subscription: global updates and/or one user's updates"""
+    channels = [GLOBAL_CHANNEL] if include_global else []
+    if user_id:
+        try:
+            channels.append(user_channel(str(uuid.UUID(user_id))))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid user ID format")
+    if not channels:
+        raise HTTPException(status_code=400, detail="Subscribe to global updates or provide a user_id")
+    return channels
+
+@app.get("/events/stream")
+async def stream_events(request: Request, user_id: str = None, include_global: bool = True):
+    """Server-Sent Events stream of report, leaderboard and rank changes"""
+    channels = event_channels(user_id, include_global)
+
+    async def event_generator():
+        subscription = event_broker.subscribe(channels)
+        try:
+            yield f"retry: 5000\n: subscribed to {', '.join(channels)}\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(HEARTBEAT_INTERVAL)
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.websocket("/events/ws")
+async def websocket_events(websocket: WebSocket, user_id: str = None, include_global: bool = True):
+    """WebSocket stream of report, leaderboard and rank changes (JSON messages)"""
+    try:
+        channels = event_channels(user_id, include_global)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await websocket.accept()
+    subscription = event_broker.subscribe(channels)
+
+    async def drain_client_messages():
+        # Clients don't send anything we act on; reading detects disconnects promptly
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    receiver = asyncio.create_task(drain_client_messages())
+    try:
+        await websocket.send_json({"type": "subscribed", "channels": channels})
+        while not receiver.done():
+            event = await subscription.get(HEARTBEAT_INTERVAL)
+            await websocket.send_json(event)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        event_broker.unsubscribe(subscription)
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import asyncio
+import hashlib
+import json
+import time
+
+from fastapi import Response
+
+
+def http_now():
+    """Current time at HTTP-date (whole second) precision"""
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class CacheEntry:
+    def __init__(self, body: bytes, media_type: str, version: int, expires_at: float, last_modified: datetime = None):
+        self.body = body
+        self.media_type = media_type
+        self.version = version
+        self.expires_at = expires_at
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.last_modified = last_modified or http_now()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Bounded LRU cache of successful JSON responses for read endpoints.
+
+    Entries are keyed by route name and query/path parameters and tagged with
+    the data version current when they were built. Write endpoints call
+    `bump()` after changing reports or users, which invalidates every entry;
+    per-route TTLs bound staleness from writes made outside this process.
+
+    Each entry carries its own Last-Modified. The ETag and date of the last
+    body built for a key are remembered across rebuilds, so a rebuild that
+    produces the same body keeps its earlier Last-Modified.
+    """
+
+    def __init__(self, ttls: dict = None, default_ttl: float = 15.0,
+                 max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024):
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = 0
+        self._entries = OrderedDict()
+        # key -> (etag, last_modified) of the last body built, kept after the entry is dropped
+        self._validators = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self):
+        """Record a data change: drop all cached bodies (their validators are kept)"""
+        self.version += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
+
+    @staticmethod
+    def make_key(route: str, params: dict) -> str:
+        return route + '?' + json.dumps(params or {}, sort_keys=True, default=str)
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != self.version or entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def _put(self, key: str, entry: CacheEntry):
+        if len(entry.body) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _stamp(self, key: str, entry: CacheEntry):
+        """Keep the previous Last-Modified for `key` if the body has not changed"""
+        previous = self._validators.pop(key, None)
+        if previous is not None and previous[0] == entry.etag:
+            entry.last_modified = previous[1]
+        self._validators[key] = (entry.etag, entry.last_modified)
+        while len(self._validators) > self.max_entries:
+            self._validators.popitem(last=False)
+
+    async def _compute(self, key: str, route: str, compute):
+        """Run `compute` once per key even when several requests miss together"""
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            version = self.version
+            response = await compute()
+            result = response
+            if response.status_code == 200 and version == self.version:
+                ttl = self.ttls.get(route, self.default_ttl)
+                result = CacheEntry(response.body, response.media_type, version, time.monotonic() + ttl)
+                self._stamp(key, result)
+                self._put(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting on it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _is_not_modified(self, request, entry: CacheEntry) -> bool:
+        if request is None:
+            return False
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match:
+            return etag_matches(if_none_match, entry.etag)
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                return entry.last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def respond(self, request, route: str, params: dict, compute):
+        """Serve `route` from the cache, honouring If-None-Match / If-Modified-Since.
+
+        `compute` is an async callable returning the uncached response; only 200
+        responses are stored. `request` may be None for internal callers.
+        """
+        key = self.make_key(route, params)
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = await self._compute(key, route, compute)
+            if not isinstance(entry, CacheEntry):
+                return entry
+
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": format_datetime(entry.last_modified, usegmt=True),
+            "Cache-Control": "no-cache"
+        }
+        if self._is_not_modified(request, entry):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
@@ -0,0 +1,215 @@
+from datetime import date, datetime, timedelta
+import asyncio
+import threading
+import time
+
+REPORT_TYPES = ['Hazardous', 'Illegal', 'Inappropriate']
+REPORT_STATUSES = ['under review', 'resolved', 'rejected', 'in progress']
+GRANULARITIES = ['day', 'week', 'month']
+
+# Upper bound on buckets returned by a single range query
+MAX_BUCKETS = 1000
+
+
+def parse_report_day(timestamp):
+    """Return the UTC calendar day of a report timestamp (ISO string or datetime)"""
+    if isinstance(timestamp, datetime):
+        return timestamp.date()
+    if isinstance(timestamp, date):
+        return timestamp
+    return date.fromisoformat(str(timestamp)[:10])
+
+
+def bucket_start(day, granularity):
+    """Return the first day of the bucket containing `day`"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Invalid granularity. Must be one of: {GRANULARITIES}")
+
+
+def next_bucket(start, granularity):
+    """Return the first day of the bucket following the one starting at `start`"""
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+class ReportRollups:
+    """In-memory per-bucket report counters keyed by report_type and status.
+
+    Counters are kept at day, week and month granularity at the same time so a
+    range query touches one entry per returned bucket. The store is filled from
+    the reports table (`backfill`) and kept current by the write endpoints
+    through `record_insert`, `record_status_change` and `record_delete`.
+
+    Reports are also changed outside this process (the app writes to Supabase
+    directly), so counters older than `max_age` seconds are `stale` and
+    `refresh` rebuilds them. Backfills run one at a time; changes recorded
+    while one is paging through history are replayed onto its result unless
+    the row had not been read yet, in which case the backfill sees the change.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._backfill_lock = asyncio.Lock()
+        self._counters = {g: {} for g in GRANULARITIES}
+        self.loaded = False
+        self.loaded_at = None
+        self.backfilled_at = None
+        # While a backfill runs: highest report_id it has read, and the changes to replay
+        self._read_through = None
+        self._pending = None
+
+    @property
+    def stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self.loaded_at >= self.max_age
+
+    def _apply(self, timestamp, report_type, status, delta):
+        day = parse_report_day(timestamp)
+        key = (report_type or '', (status or '').lower())
+        for granularity in GRANULARITIES:
+            cells = self._counters[granularity].setdefault(bucket_start(day, granularity), {})
+            count = cells.get(key, 0) + delta
+            if count > 0:
+                cells[key] = count
+            else:
+                cells.pop(key, None)
+
+    def _record(self, report_id, changes):
+        """Apply (timestamp, report_type, status, delta) changes; call with the lock held"""
+        if self.loaded:
+            for change in changes:
+                self._apply(*change)
+        if self._pending is not None:
+            # A row the running backfill has not reached yet will be read with this change in it.
+            # A change racing the fetch of its own page can be missed; the next refresh corrects it.
+            if report_id is None or (self._read_through is not None and report_id <= self._read_through):
+                self._pending.extend(changes)
+
+    async def backfill(self, fetch_page, page_size=1000):
+        """Rebuild all counters from history.
+
+        `fetch_page(after_report_id, limit)` is awaited and must return up to
+        `limit` report rows with `report_id` greater than `after_report_id`
+        (None for the first page), ordered by `report_id`, with `timestamp`,
+        `report_type` and `status` columns.
+        """
+        async with self._backfill_lock:
+            return await self._backfill(fetch_page, page_size)
+
+    async def refresh(self, fetch_page, page_size=1000):
+        """Backfill if the counters are stale; concurrent callers share one backfill.
+
+        Returns the number of reports loaded, or None if no backfill was needed.
+        """
+        async with self._backfill_lock:
+            if not self.stale:
+                return None
+            return await self._backfill(fetch_page, page_size)
+
+    async def _backfill(self, fetch_page, page_size):
+        counters = ReportRollups()
+        loaded = 0
+        with self._lock:
+            self._read_through = None
+            self._pending = []
+        try:
+            while True:
+                rows = await fetch_page(self._read_through, page_size)
+                for row in rows:
+                    if row.get('timestamp'):
+                        counters._apply(row['timestamp'], row.get('report_type'), row.get('status'), 1)
+                loaded += len(rows)
+                if rows:
+                    with self._lock:
+                        self._read_through = rows[-1]['report_id']
+                if len(rows) < page_size:
+                    break
+
+            with self._lock:
+                for change in self._pending:
+                    counters._apply(*change)
+                self._counters = counters._counters
+                self.loaded = True
+                self.loaded_at = time.monotonic()
+                self.backfilled_at = datetime.utcnow().isoformat()
+        finally:
+            with self._lock:
+                self._read_through = None
+                self._pending = None
+        return loaded
+
+    def record_insert(self, timestamp, report_type, status, report_id=None):
+        with self._lock:
+            self._record(report_id, [(timestamp, report_type, status, 1)])
+
+    def record_delete(self, timestamp, report_type, status, report_id=None):
+        with self._lock:
+            self._record(report_id, [(timestamp, report_type, status, -1)])
+
+    def record_status_change(self, timestamp, report_type, old_status, new_status, report_id=None):
+        with self._lock:
+            if (old_status or '').lower() != (new_status or '').lower():
+                self._record(report_id, [(timestamp, report_type, old_status, -1),
+                                         (timestamp, report_type, new_status, 1)])
+
+    def histogram(self, start, end, granularity='day', report_type=None, status=None):
+        """Return one bucket per `granularity` step covering [start, end].
+
+        Each bucket's `start`/`end` are clamped to the requested range; a partial
+        first or last week/month is counted from the day counters it covers.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Invalid granularity. Must be one of: {GRANULARITIES}")
+        if end < start:
+            raise ValueError("end must not be before start")
+
+        buckets = []
+        current = bucket_start(start, granularity)
+        with self._lock:
+            counters = self._counters[granularity]
+            days = self._counters['day']
+            while current <= end:
+                if len(buckets) >= MAX_BUCKETS:
+                    raise ValueError(f"Range too large: more than {MAX_BUCKETS} {granularity} buckets")
+                following = next_bucket(current, granularity)
+                first = max(current, start)
+                last = min(following - timedelta(days=1), end)
+                if first == current and last == following - timedelta(days=1):
+                    cells = [counters.get(current, {})]
+                else:
+                    cells = [days.get(first + timedelta(days=i), {}) for i in range((last - first).days + 1)]
+
+                by_type = {t: 0 for t in REPORT_TYPES}
+                by_status = {s: 0 for s in REPORT_STATUSES}
+                total = 0
+                for day_cells in cells:
+                    for (cell_type, cell_status), count in day_cells.items():
+                        if report_type and cell_type != report_type:
+                            continue
+                        if status and cell_status != status:
+                            continue
+                        total += count
+                        if cell_type in by_type:
+                            by_type[cell_type] += count
+                        if cell_status in by_status:
+                            by_status[cell_status] += count
+                buckets.append({
+                    "bucket": current.isoformat(),
+                    "start": first.isoformat(),
+                    "end": last.isoformat(),
+                    "total": total,
+                    "by_type": by_type,
+                    "by_status": by_status
+                })
+                current = following
+        return buckets
@@ -1,53 +1,277 @@
+"""Offline batch scanner: run the billboard model over a directory tree or file list.
+
+    python test_model.py photos/ --output scan_out --crops --annotated
+    python test_model.py --file-list paths.txt --output scan_out --batch-size 32
+
+Images are decoded in a thread pool, downscaled to --max-side and run through
+YOLO in batches. Detections go to <output>/detections.jsonl, one line per image,
+with width, height and boxes in the original image's pixels and `scale` giving
+the factor the image was scanned at. Crops and annotated images are written
+optionally, at the scanned resolution. <output>/checkpoint.json records
+progress after every batch, so rerunning the same command resumes where an
+interrupted run stopped. The checkpoint also stores the last completed path,
+and a resume whose inputs no longer line up with it is refused. Use --restart
+to start over.
+"""
+import argparse
+import json
 import os
-from ultralytics import YOLO
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from inference_pool import MAX_IMAGE_SIDE, decode_image_with_size, save_bgr_image
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'best.pt')
-TEST_IMAGE_PATH = r'C:\Users\Viraj Walavalkar\Desktop\technova-hackathon\my_app\backend\static\croppedresult\billboard5.png'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+CHECKPOINT_FILE = "checkpoint.json"
+DETECTIONS_FILE = "detections.jsonl"
 
-def run_model(image_path):
-    model = YOLO(MODEL_PATH)
-    results = model(image_path)
-    results[0].show()
-    print(results)
 
-if __name__ == '__main__':
-    run_model(TEST_IMAGE_PATH)
-    # Load original image
-    from PIL import Image
-    import numpy as np
-    img = Image.open(image_path)
-    img_np = np.array(img)
-    # Ensure output_dir is valid
-    if output_dir is None:
-            output_dir = os.path.abspath("static/croppedresult")
+def iter_inputs(paths, file_list=None):
+    """Yield image paths in a deterministic order (resuming relies on it)"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+    if file_list:
+        with open(file_list, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+
+
+def load_image(path: str, max_side: int):
+    """Return (BGR image downscaled to max_side, original (width, height))"""
+    with open(path, 'rb') as f:
+        return decode_image_with_size(f.read(), max_side)
+
+
+def new_checkpoint():
+    return {"completed": 0, "last_path": None, "jsonl_bytes": 0, "detections": 0, "errors": 0}
+
+
+def load_checkpoint(output_dir: str):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return new_checkpoint()
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(output_dir: str, checkpoint: dict):
+    """Atomically replace the checkpoint file"""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def output_stem(index: int, path: str) -> str:
+    return f"{index:08d}_{os.path.splitext(os.path.basename(path))[0]}"
+
+
+def save_outputs(index, path, image, result, crops_dir, annotated_dir):
+    """Write crops and/or the annotated image for one result (runs in the thread pool)"""
+    stem = output_stem(index, path)
+    if crops_dir:
+        height, width = image.shape[:2]
+        for k, box in enumerate(result.boxes.xyxy.tolist()):
+            x1, y1, x2, y2 = (int(v) for v in box)
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 > x1 and y2 > y1:
+                save_bgr_image(image[y1:y2, x1:x2], os.path.join(crops_dir, f"{stem}_{k}.png"))
+    if annotated_dir:
+        save_bgr_image(result.plot(), os.path.join(annotated_dir, f"{stem}.jpg"))
+
+
+class Progress:
+    def __init__(self, interval: float, already_done: int):
+        self.interval = interval
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.last_count = 0
+        self.already_done = already_done
+        self.count = 0
+        self.detections = 0
+        self.errors = 0
+
+    def update(self, images: int, detections: int, errors: int, force: bool = False):
+        self.count += images
+        self.detections += detections
+        self.errors += errors
+        now = time.monotonic()
+        if not force and now - self.last_report < self.interval:
+            return
+        elapsed = now - self.start
+        recent = (self.count - self.last_count) / max(now - self.last_report, 1e-9)
+        print(f"[{elapsed:7.1f}s] {self.already_done + self.count} images "
+              f"({self.count / max(elapsed, 1e-9):.1f}/s overall, {recent:.1f}/s recent), "
+              f"{self.detections} detections, {self.errors} errors", flush=True)
+        self.last_report = now
+        self.last_count = self.count
+
+
+def scan(args):
+    from ultralytics import YOLO
+
+    os.makedirs(args.output, exist_ok=True)
+    crops_dir = os.path.join(args.output, "crops") if args.crops else None
+    annotated_dir = os.path.join(args.output, "annotated") if args.annotated else None
+    for directory in (crops_dir, annotated_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    jsonl_path = os.path.join(args.output, DETECTIONS_FILE)
+    if args.restart:
+        checkpoint = new_checkpoint()
     else:
-            output_dir = os.path.abspath(output_dir)
-    os.makedirs(output_dir, exist_ok=True)
-        # Crop and save each detected billboard
-    count = 0
-    for box in results[0].boxes.xyxy:
-            x1, y1, x2, y2 = map(int, box)
-            cropped = img_np[y1:y2, x1:x2]
-            cropped_img = Image.fromarray(cropped)
-            save_path = os.path.join(output_dir, f"cropped_billboard_{count}.png")
-            cropped_img.save(save_path)
-            print(f"Saved cropped image: {save_path}")
-            count += 1
-    print(f"Saving cropped results to: {output_dir}")
-        # List files in output_dir
-    files = os.listdir(output_dir)
-    print(f"Files in output_dir: {files}")
-        # Find cropped images
-    cropped_files = [f for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-    print(f"Found files: {cropped_files}")
+        checkpoint = load_checkpoint(args.output)
+
+    inputs = iter_inputs(args.paths, args.file_list)
+    # Skip what the checkpoint says is done; anything written after it is discarded below
+    last_path = None
+    for _ in range(checkpoint["completed"]):
+        last_path = next(inputs, None)
+        if last_path is None:
+            break
+    if checkpoint["completed"]:
+        # Inputs that changed since the checkpoint would shift every index after it
+        if last_path is None or last_path != checkpoint.get("last_path"):
+            print(f"Cannot resume: input {checkpoint['completed']} is now {last_path!r}, but the checkpoint in "
+                  f"{args.output} ended at {checkpoint.get('last_path')!r}. Rerun with --restart to start over.",
+                  file=sys.stderr)
+            return 2
+        print(f"Resuming after {checkpoint['completed']} images ({last_path})")
+    index = checkpoint["completed"]
+
+    model = YOLO(args.model)
+    progress = Progress(args.progress_interval, checkpoint["completed"])
+
+    jsonl = open(jsonl_path, 'a+b')
+    jsonl.truncate(checkpoint["jsonl_bytes"])
+    jsonl.seek(0, os.SEEK_END)
+
+    prefetch = args.batch_size * 2
+    pending = deque()
+    writes = deque()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        def fill():
+            while len(pending) < prefetch:
+                path = next(inputs, None)
+                if path is None:
+                    return
+                pending.append((path, pool.submit(load_image, path, args.max_side)))
+
+        try:
+            fill()
+            while pending:
+                batch = []
+                while pending and len(batch) < args.batch_size:
+                    batch.append(pending.popleft())
+                fill()
+
+                records, images = [], []
+                for path, future in batch:
+                    try:
+                        image, (width, height) = future.result()
+                        images.append((len(records), image))
+                        records.append({"index": index, "path": path, "width": width, "height": height,
+                                        "scale": round(image.shape[1] / width, 6)})
+                    except Exception as e:
+                        records.append({"index": index, "path": path, "error": f"{type(e).__name__}: {e}"})
+                    index += 1
+
+                if images:
+                    results = model([image for _, image in images], verbose=False, conf=args.conf,
+                                    imgsz=args.imgsz, device=args.device)
+                    for (position, image), result in zip(images, results):
+                        record = records[position]
+                        # Boxes are in scanned pixels; map them back onto the original image
+                        scale_x = record["width"] / image.shape[1]
+                        scale_y = record["height"] / image.shape[0]
+                        record["detections"] = [
+                            {
+                                "box": [round(float(box[0]) * scale_x, 1), round(float(box[1]) * scale_y, 1),
+                                        round(float(box[2]) * scale_x, 1), round(float(box[3]) * scale_y, 1)],
+                                "confidence": round(float(conf), 4),
+                                "class_id": int(cls),
+                                "label": result.names.get(int(cls), str(int(cls)))
+                            }
+                            for box, conf, cls in zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist(),
+                                                      result.boxes.cls.tolist())
+                        ]
+                        if record["detections"] and (crops_dir or annotated_dir):
+                            writes.append(pool.submit(save_outputs, record["index"], record["path"], image, result,
+                                                      crops_dir, annotated_dir))
+
+                # Crops and annotated images for this batch must exist before it is checkpointed
+                while writes:
+                    writes.popleft().result()
+
+                for record in records:
+                    jsonl.write((json.dumps(record) + "\n").encode('utf-8'))
+                jsonl.flush()
+                os.fsync(jsonl.fileno())
+
+                batch_detections = sum(len(r.get("detections", [])) for r in records)
+                batch_errors = sum(1 for r in records if "error" in r)
+                checkpoint = {
+                    "completed": index,
+                    "last_path": records[-1]["path"],
+                    "jsonl_bytes": jsonl.tell(),
+                    "detections": checkpoint["detections"] + batch_detections,
+                    "errors": checkpoint["errors"] + batch_errors
+                }
+                save_checkpoint(args.output, checkpoint)
+                progress.update(len(records), batch_detections, batch_errors)
+        except KeyboardInterrupt:
+            print(f"\nInterrupted; rerun the same command to resume after image {checkpoint['completed']}")
+            for _, future in pending:
+                future.cancel()
+            return 130
+        finally:
+            jsonl.close()
+
+    progress.update(0, 0, 0, force=True)
+    print(f"Done: {checkpoint['completed']} images, {checkpoint['detections']} detections, "
+          f"{checkpoint['errors']} errors. Results in {jsonl_path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan images for billboards with the YOLO model")
+    parser.add_argument("paths", nargs="*", help="image files or directories (walked recursively)")
+    parser.add_argument("--file-list", help="text file with one image path per line")
+    parser.add_argument("--output", default="scan_output", help="directory for detections, crops and checkpoint")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=min(8, (os.cpu_count() or 1) + 2),
+                        help="threads for decoding and writing images")
+    parser.add_argument("--max-side", type=int, default=MAX_IMAGE_SIDE, help="downscale larger images before inference")
+    parser.add_argument("--conf", type=float, default=0.25, help="minimum detection confidence")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--device", default=None, help="e.g. cpu, 0, cuda:0")
+    parser.add_argument("--crops", action="store_true", help="save a crop of every detection")
+    parser.add_argument("--annotated", action="store_true", help="save annotated images that have detections")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between throughput reports")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args(argv)
+    if not args.paths and not args.file_list:
+        parser.error("give at least one image path, directory or --file-list")
+    return scan(args)
+
 
 if __name__ == '__main__':
-    image_path = TEST_IMAGE_PATH
-    output_dir = None
-    if len(sys.argv) > 2:
-        image_path = sys.argv[1]
-        output_dir = sys.argv[2]
-    elif len(sys.argv) > 1:
-        image_path = sys.argv[1]
-    run_model(image_path, output_dir)
-        
+    sys.exit(main())
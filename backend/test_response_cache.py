@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import Response
+
+import response_cache
+from response_cache import ResponseCache, etag_matches
+
+
+class FakeRequest:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class Route:
+    """A compute callable that counts calls and returns the current body"""
+
+    def __init__(self, body=b'{"count": 1}', status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return Response(content=self.body, media_type="application/json", status_code=self.status_code)
+
+
+def respond(cache, route, headers=None, params=None):
+    request = FakeRequest(headers) if headers is not None else None
+    return asyncio.run(cache.respond(request, "route", params or {}, route))
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+
+
+def test_hit_and_if_none_match():
+    cache, route = ResponseCache(), Route()
+    first = respond(cache, route)
+    assert first.status_code == 200
+    assert first.body == route.body
+    etag = first.headers["etag"]
+
+    assert respond(cache, route).body == route.body
+    not_modified = respond(cache, route, {"if-none-match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert route.calls == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_params_are_cached_separately():
+    cache, route = ResponseCache(), Route()
+    respond(cache, route, params={"page": 1})
+    respond(cache, route, params={"page": 2})
+    respond(cache, route, params={"page": 1})
+    assert route.calls == 2
+
+
+def test_bump_rebuilds_and_changes_etag():
+    cache, route = ResponseCache(), Route()
+    etag = respond(cache, route).headers["etag"]
+    route.body = b'{"count": 2}'
+    cache.bump()
+    response = respond(cache, route, {"if-none-match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert route.calls == 2
+
+
+def test_last_modified_is_kept_when_body_is_unchanged(monkeypatch):
+    cache, route = ResponseCache(), Route()
+    built = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    monkeypatch.setattr(response_cache, "http_now", lambda: built)
+    last_modified = respond(cache, route).headers["last-modified"]
+    assert last_modified == format_datetime(built, usegmt=True)
+
+    # A write elsewhere invalidates the entry but this route's body comes back identical
+    monkeypatch.setattr(response_cache, "http_now", lambda: datetime(2026, 1, 2, tzinfo=timezone.utc))
+    cache.bump()
+    response = respond(cache, route, {"if-modified-since": last_modified})
+    assert response.status_code == 304
+    assert response.headers["last-modified"] == last_modified
+    assert route.calls == 2
+
+    route.body = b'{"count": 2}'
+    cache.bump()
+    response = respond(cache, route, {"if-modified-since": last_modified})
+    assert response.status_code == 200
+    assert response.headers["last-modified"] == "Fri, 02 Jan 2026 00:00:00 GMT"
+
+
+def test_errors_are_not_cached():
+    cache, route = ResponseCache(), Route(b'{"error": "boom"}', status_code=500)
+    assert respond(cache, route).status_code == 500
+    assert respond(cache, route).status_code == 500
+    assert route.calls == 2
+
+
+def test_concurrent_misses_compute_once():
+    cache, route = ResponseCache(), Route()
+
+    async def main():
+        return await asyncio.gather(*[cache.respond(None, "route", {}, route) for _ in range(5)])
+
+    responses = asyncio.run(main())
+    assert route.calls == 1
+    assert {r.headers["etag"] for r in responses} == {responses[0].headers["etag"]}
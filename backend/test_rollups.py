@@ -0,0 +1,168 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from rollups import ReportRollups
+
+
+def make_rows():
+    rows = []
+    # One Illegal report under review on each day of January 2026
+    for day in range(1, 32):
+        rows.append({"timestamp": f"2026-01-{day:02d}T10:00:00", "report_type": "Illegal", "status": "under review"})
+    rows.append({"timestamp": "2026-01-15T12:00:00", "report_type": "Hazardous", "status": "Resolved"})
+    rows.append({"timestamp": "2026-02-02T08:00:00", "report_type": "Inappropriate", "status": "rejected"})
+    for report_id, row in enumerate(rows, 1):
+        row["report_id"] = report_id
+    return rows
+
+
+def history(rows, pages=None, on_page=None):
+    """A fetch_page over `rows` that records each (after_report_id, limit) call"""
+    async def fetch_page(after_report_id, limit):
+        if pages is not None:
+            pages.append((after_report_id, limit))
+        if on_page is not None:
+            await on_page(after_report_id)
+        return [dict(row) for row in rows if after_report_id is None or row["report_id"] > after_report_id][:limit]
+    return fetch_page
+
+
+def loaded_rollups(rows=None, page_size=7):
+    rows = make_rows() if rows is None else rows
+    pages = []
+    rollups = ReportRollups()
+    loaded = asyncio.run(rollups.backfill(history(rows, pages), page_size=page_size))
+    assert loaded == len(rows)
+    return rollups, pages
+
+
+def totals(buckets):
+    return [(b["start"], b["end"], b["total"]) for b in buckets]
+
+
+def test_backfill_pages_through_history():
+    rollups, pages = loaded_rollups()
+    assert rollups.loaded
+    assert pages[0] == (None, 7)
+    assert pages[-1][0] == 28
+    buckets = rollups.histogram(date(2026, 1, 15), date(2026, 1, 15))
+    assert buckets[0]["total"] == 2
+    assert buckets[0]["by_type"]["Hazardous"] == 1
+    assert buckets[0]["by_status"]["resolved"] == 1
+
+
+def test_updates_ignored_until_loaded():
+    rollups = ReportRollups()
+    rollups.record_insert("2026-01-01", "Illegal", "under review")
+    rollups, _ = loaded_rollups([])
+    assert rollups.histogram(date(2026, 1, 1), date(2026, 1, 1))[0]["total"] == 0
+
+
+def test_insert_delete_and_status_change():
+    rollups, _ = loaded_rollups()
+    day = date(2026, 1, 3)
+    rollups.record_insert("2026-01-03T09:00:00", "Illegal", "under review")
+    assert rollups.histogram(day, day)[0]["by_status"]["under review"] == 2
+
+    rollups.record_status_change("2026-01-03T09:00:00", "Illegal", "under review", "Resolved")
+    bucket = rollups.histogram(day, day)[0]
+    assert bucket["total"] == 2
+    assert bucket["by_status"]["under review"] == 1
+    assert bucket["by_status"]["resolved"] == 1
+    assert rollups.histogram(day, day, status="resolved")[0]["total"] == 1
+
+    rollups.record_delete("2026-01-03T09:00:00", "Illegal", "resolved")
+    assert rollups.histogram(day, day, status="resolved")[0]["total"] == 0
+    month = rollups.histogram(date(2026, 1, 1), date(2026, 1, 31), "month")[0]
+    assert month["by_status"]["under review"] == 31
+
+
+def test_week_histogram_clamps_edge_buckets():
+    rollups, _ = loaded_rollups()
+    # 2026-01-10 is a Saturday; weeks start on Monday
+    buckets = rollups.histogram(date(2026, 1, 10), date(2026, 1, 20), "week")
+    assert [b["bucket"] for b in buckets] == ["2026-01-05", "2026-01-12", "2026-01-19"]
+    assert totals(buckets) == [
+        ("2026-01-10", "2026-01-11", 2),
+        ("2026-01-12", "2026-01-18", 8),
+        ("2026-01-19", "2026-01-20", 2),
+    ]
+
+
+def test_month_histogram_clamps_edge_buckets():
+    rollups, _ = loaded_rollups()
+    buckets = rollups.histogram(date(2026, 1, 20), date(2026, 2, 28), "month")
+    assert totals(buckets) == [
+        ("2026-01-20", "2026-01-31", 12),
+        ("2026-02-01", "2026-02-28", 1),
+    ]
+    full = rollups.histogram(date(2026, 1, 1), date(2026, 1, 31), "month")
+    assert totals(full) == [("2026-01-01", "2026-01-31", 32)]
+    assert rollups.histogram(date(2026, 1, 1), date(2026, 2, 28), "month", report_type="Inappropriate")[1]["total"] == 1
+
+
+def test_histogram_rejects_bad_arguments():
+    rollups, _ = loaded_rollups([])
+    with pytest.raises(ValueError):
+        rollups.histogram(date(2026, 1, 1), date(2026, 1, 2), "year")
+    with pytest.raises(ValueError):
+        rollups.histogram(date(2026, 1, 2), date(2026, 1, 1))
+    with pytest.raises(ValueError):
+        rollups.histogram(date(2000, 1, 1), date(2026, 1, 1))
+
+
+def test_refresh_only_rebuilds_stale_counters(monkeypatch):
+    rows = make_rows()
+    rollups = ReportRollups(max_age=60)
+    assert rollups.stale
+    assert asyncio.run(rollups.refresh(history(rows))) == len(rows)
+    assert not rollups.stale
+    assert asyncio.run(rollups.refresh(history(rows))) is None
+
+    # A report deleted outside this process shows up once the counters expire
+    del rows[0]
+    now = rollups.loaded_at + 61
+    monkeypatch.setattr("rollups.time.monotonic", lambda: now)
+    assert rollups.stale
+    assert asyncio.run(rollups.refresh(history(rows))) == len(rows)
+    assert rollups.histogram(date(2026, 1, 1), date(2026, 1, 1))[0]["total"] == 0
+
+
+def test_concurrent_refreshes_share_one_backfill():
+    rows = make_rows()
+    pages = []
+    rollups = ReportRollups()
+
+    async def main():
+        return await asyncio.gather(*[rollups.refresh(history(rows, pages, lambda _: asyncio.sleep(0)), page_size=10)
+                                      for _ in range(3)])
+
+    assert asyncio.run(main()) == [len(rows), None, None]
+    assert [after for after, _ in pages] == [None, 10, 20, 30]
+
+
+def test_changes_during_backfill_are_not_lost():
+    rows = make_rows()
+    rollups = ReportRollups()
+
+    async def write_midway(after_report_id):
+        await asyncio.sleep(0)
+        if after_report_id == 10:
+            # Row 3 was read before these changes; rows 20 and 34 are read after them
+            rows[2]["status"] = "resolved"
+            rollups.record_status_change(rows[2]["timestamp"], "Illegal", "under review", "resolved", 3)
+            rows[19]["status"] = "rejected"
+            rollups.record_status_change(rows[19]["timestamp"], "Illegal", "under review", "rejected", 20)
+            rows.append({"report_id": 34, "timestamp": "2026-01-03T11:00:00",
+                         "report_type": "Illegal", "status": "resolved"})
+            rollups.record_insert("2026-01-03T11:00:00", "Illegal", "resolved", 34)
+
+    asyncio.run(rollups.backfill(history(rows, on_page=write_midway), page_size=10))
+    bucket = rollups.histogram(date(2026, 1, 3), date(2026, 1, 3))[0]
+    assert bucket["total"] == 2
+    assert bucket["by_status"]["resolved"] == 2
+    assert rollups.histogram(date(2026, 1, 20), date(2026, 1, 20))[0]["by_status"]["rejected"] == 1
+    month = rollups.histogram(date(2026, 1, 1), date(2026, 1, 31), "month")[0]
+    assert month["total"] == 33
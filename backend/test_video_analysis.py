@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+import video_analysis
+from video_analysis import (BillboardTracker, VideoDecodeError, analyze_video, box_iou, interpolate_gps,
+                            parse_gps_track, sample_frames)
+
+
+def write_clip(path, frames=100, fps=30, pattern=lambda index: 0):
+    """Write a small MJPG clip whose frame `index` is filled with `pattern(index)`"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for index in range(frames):
+        writer.write(np.full((48, 64, 3), pattern(index), np.uint8))
+    writer.release()
+    return str(path)
+
+
+def detection(x, confidence=0.9, width=100):
+    return {"box": [x, 50.0, x + width, 150.0], "confidence": confidence, "label": "billboard"}
+
+
+def feed(tracker, frames, step=0.5):
+    """Run per-frame detection lists through the tracker; return every track that ended"""
+    ended = []
+    for index, detections in enumerate(frames):
+        ended.extend(tracker.update(index, index * step, f"frame{index}", detections))
+    return ended
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert box_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+    assert box_iou([0, 0, 10, 10], [5, 0, 15, 10]) == pytest.approx(50 / 150)
+
+
+def test_tracker_reports_one_billboard_with_its_best_frame():
+    tracker = BillboardTracker()
+    ended = feed(tracker, [[detection(0, 0.5)], [detection(10, 0.95)], [detection(20, 0.7)]])
+    assert ended == []
+    tracks = tracker.flush()
+    assert len(tracks) == 1
+    track = tracks[0]
+    assert track.hits == 3
+    assert track.best_confidence == 0.95
+    assert track.best_frame == "frame1"
+    assert track.summary()["best_frame"] == 1
+
+
+def test_tracker_ends_tracks_after_max_missed():
+    tracker = BillboardTracker(max_missed=1)
+    ended = feed(tracker, [[detection(0)], [detection(0)], [], []])
+    assert [track.hits for track in ended] == [2]
+    assert tracker.tracks == []
+
+
+def test_tracker_drops_single_hits_and_low_confidence():
+    tracker = BillboardTracker(min_hits=2, min_confidence=0.35)
+    feed(tracker, [[detection(0), detection(500, 0.2)], [detection(500, 0.2)]])
+    assert tracker.flush() == []
+
+
+def test_eviction_keeps_live_confirmed_tracks():
+    tracker = BillboardTracker(max_tracks=2)
+    confirmed = [detection(0), detection(300)]
+    feed(tracker, [confirmed, confirmed])
+    # A third billboard appears while both confirmed tracks are still matched:
+    # the new tentative track is dropped instead
+    ended = tracker.update(2, 1.0, "frame2", confirmed + [detection(600)])
+    assert ended == []
+    assert sorted(track.hits for track in tracker.tracks) == [3, 3]
+
+
+def test_eviction_never_splits_a_live_track():
+    # With min_hits=1 every new track is confirmed at once, so live tracks can outnumber max_tracks
+    tracker = BillboardTracker(max_tracks=1, min_hits=1)
+    confirmed = [detection(0), detection(300)]
+    feed(tracker, [confirmed, confirmed])
+    assert sorted(track.hits for track in tracker.tracks) == [2, 2]
+
+    # Once one is missed it is the one closed to get back under the limit
+    ended = tracker.update(2, 1.0, "frame2", [detection(0)])
+    assert [track.box[0] for track in ended] == [300]
+    assert [track.hits for track in tracker.tracks] == [3]
+    assert [track.id for track in tracker.flush()] == [1]
+
+
+def test_parse_gps_track():
+    points = parse_gps_track('[{"time": 2, "latitude": 19.1, "lon": 72.9}, {"t": 0, "lat": 19.0, "lng": 72.8}]')
+    assert points == [(0.0, 19.0, 72.8), (2.0, 19.1, 72.9)]
+    assert parse_gps_track("  ") == []
+    with pytest.raises(ValueError):
+        parse_gps_track('[{"t": 1, "lat": 19.0}]')
+
+
+def test_interpolate_gps():
+    points = [(0.0, 19.0, 72.8), (10.0, 19.1, 73.0)]
+    lat, lng = interpolate_gps(points, 5.0)
+    assert lat == pytest.approx(19.05)
+    assert lng == pytest.approx(72.9)
+    assert interpolate_gps(points, -1.0) == (19.0, 72.8)
+    assert interpolate_gps(points, 20.0) == (19.1, 73.0)
+    assert interpolate_gps([], 1.0) == (None, None)
+
+
+def test_static_scene_decodes_only_candidates(tmp_path, monkeypatch):
+    path = write_clip(tmp_path / "static.avi")
+    conversions = []
+    cvt_color = cv2.cvtColor
+    monkeypatch.setattr(video_analysis.cv2, "cvtColor", lambda *args: conversions.append(1) or cvt_color(*args))
+    stats = {}
+    # 0.2s / 2.0s at 30 fps: a candidate every 6 frames, a forced keep every 60
+    assert [index for index, _, _ in sample_frames(path, stats=stats)] == [0, 60]
+    assert stats == {"frames": 100, "sampled": 2, "fps": 30.0}
+    assert len(conversions) == 17
+
+
+def test_changing_scene_keeps_every_candidate(tmp_path):
+    path = write_clip(tmp_path / "stripes.avi", pattern=lambda index: 255 if (index // 6) % 2 else 0)
+    assert [index for index, _, _ in sample_frames(path)] == list(range(0, 100, 6))
+
+
+def test_unreadable_video(tmp_path):
+    path = tmp_path / "broken.mp4"
+    path.write_bytes(b"not a video")
+    with pytest.raises(VideoDecodeError):
+        list(sample_frames(str(path)))
+
+
+def test_analyze_video_sends_batches(tmp_path):
+    path = write_clip(tmp_path / "stripes.avi", pattern=lambda index: 255 if (index // 6) % 2 else 0)
+    batches, billboards = [], []
+
+    async def infer_batch(frames):
+        batches.append(len(frames))
+        return [(None, [detection(10)]) for _ in frames]
+
+    async def on_billboard(track):
+        billboards.append(track.summary())
+
+    stats = asyncio.run(analyze_video(path, infer_batch, on_billboard, batch_size=8))
+    assert batches == [8, 8, 1]
+    assert stats["sampled"] == 17
+    assert stats["billboards"] == 1
+    assert billboards[0]["hits"] == 17
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import math
+
+import cv2
+import numpy as np
+
+from inference_pool import MAX_IMAGE_SIDE
+
+
+class VideoDecodeError(Exception):
+    """Raised when a video file cannot be opened for decoding"""
+
+
+def sample_frames(path: str, min_interval: float = 0.2, max_interval: float = 2.0,
+                  diff_threshold: float = 6.0, max_side: int = MAX_IMAGE_SIDE, stats: dict = None):
+    """Yield (frame_index, seconds, BGR frame) for the frames worth analysing.
+
+    Frames are read one at a time. Every `min_interval` seconds after the
+    last kept frame a candidate is decoded, and it is kept when its 64x36
+    grayscale thumbnail differs from the last kept frame's by more than
+    `diff_threshold` (mean absolute difference, 0-255), or when `max_interval`
+    seconds have passed regardless. Frames between candidates are grabbed but
+    never decoded, so a static scene costs one decode per `min_interval`.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("frames", 0)
+    stats.setdefault("sampled", 0)
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise VideoDecodeError("Could not open video")
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if not fps or math.isnan(fps) or fps <= 0:
+        fps = 30.0
+    stats["fps"] = fps
+    min_step = max(1, int(round(min_interval * fps)))
+    max_step = max(min_step, int(round(max_interval * fps)))
+
+    index = -1
+    last_index = None
+    last_thumb = None
+    try:
+        while capture.grab():
+            index += 1
+            stats["frames"] += 1
+            since = None if last_index is None else index - last_index
+            if since is not None and since < max_step and since % min_step:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            thumb = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.int16)
+            if last_thumb is not None and since < max_step \
+                    and np.abs(thumb - last_thumb).mean() < diff_threshold:
+                continue
+            last_thumb = thumb
+            last_index = index
+
+            height, width = frame.shape[:2]
+            if max(height, width) > max_side:
+                scale = max_side / max(height, width)
+                frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            stats["sampled"] += 1
+            yield index, index / fps, np.ascontiguousarray(frame)
+    finally:
+        capture.release()
+
+
+def box_iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, frame_index, t, frame, detection):
+        self.id = track_id
+        self.box = detection["box"]
+        self.last_t = t
+        self.velocity = (0.0, 0.0)
+        self.first_t = t
+        self.hits = 1
+        self.missed = 0
+        self.label = detection.get("label")
+        self.best_confidence = detection["confidence"]
+        self.best_box = detection["box"]
+        self.best_frame_index = frame_index
+        self.best_t = t
+        self.best_frame = frame
+
+    def predicted_box(self, t):
+        """Last box shifted by the track's centre velocity (camera motion between samples)"""
+        dt = t - self.last_t
+        dx, dy = self.velocity[0] * dt, self.velocity[1] * dt
+        x1, y1, x2, y2 = self.box
+        return [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+
+    def update(self, frame_index, t, frame, detection):
+        box = detection["box"]
+        dt = t - self.last_t
+        if dt > 0:
+            self.velocity = (
+                ((box[0] + box[2]) - (self.box[0] + self.box[2])) / 2 / dt,
+                ((box[1] + box[3]) - (self.box[1] + self.box[3])) / 2 / dt
+            )
+        self.box = box
+        self.last_t = t
+        self.hits += 1
+        self.missed = 0
+        if detection["confidence"] > self.best_confidence:
+            self.best_confidence = detection["confidence"]
+            self.best_box = box
+            self.best_frame_index = frame_index
+            self.best_t = t
+            self.best_frame = frame
+
+    def summary(self):
+        return {
+            "track_id": self.id,
+            "label": self.label,
+            "first_seen": round(self.first_t, 2),
+            "last_seen": round(self.last_t, 2),
+            "hits": self.hits,
+            "best_frame": self.best_frame_index,
+            "best_time": round(self.best_t, 2),
+            "confidence": self.best_confidence,
+            "box": self.best_box
+        }
+
+
+class BillboardTracker:
+    """Greedy IoU tracker over sampled frames, one track per physical billboard.
+
+    Detections are matched against each track's motion-predicted box. A track
+    ends after `max_missed` sampled frames without a match and is reported if it
+    was seen at least `min_hits` times. Each track keeps only its best
+    (highest-confidence) frame, so memory does not grow with clip length.
+    Beyond `max_tracks` open tracks, tentative tracks (fewer than `min_hits`)
+    and then tracks that missed the latest frame are closed, stalest first;
+    confirmed tracks still being matched are never cut short, since they
+    would be reported again when the billboard is next seen.
+    """
+
+    def __init__(self, iou_threshold: float = 0.2, max_missed: int = 2, min_hits: int = 2,
+                 min_confidence: float = 0.35, max_tracks: int = 16):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.min_confidence = min_confidence
+        self.max_tracks = max_tracks
+        self.tracks = []
+        self._next_id = 1
+
+    def _finish(self, tracks):
+        finished = [track for track in tracks if track.hits >= self.min_hits]
+        for track in tracks:
+            if track.hits < self.min_hits:
+                track.best_frame = None
+        return finished
+
+    def update(self, frame_index, t, frame, detections):
+        """Feed one sampled frame's detections; return tracks that just ended"""
+        detections = [d for d in detections if d["confidence"] >= self.min_confidence]
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            predicted = track.predicted_box(t)
+            for di, detection in enumerate(detections):
+                iou = box_iou(predicted, detection["box"])
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, ti, di))
+        pairs.sort(reverse=True)
+
+        matched_tracks, matched_detections = set(), set()
+        for _, ti, di in pairs:
+            if ti in matched_tracks or di in matched_detections:
+                continue
+            self.tracks[ti].update(frame_index, t, frame, detections[di])
+            matched_tracks.add(ti)
+            matched_detections.add(di)
+
+        ended = []
+        open_tracks = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+            (ended if track.missed > self.max_missed else open_tracks).append(track)
+        for di, detection in enumerate(detections):
+            if di not in matched_detections:
+                open_tracks.append(Track(self._next_id, frame_index, t, frame, detection))
+                self._next_id += 1
+
+        excess = len(open_tracks) - self.max_tracks
+        if excess > 0:
+            evictable = [track for track in open_tracks if track.missed > 0 or track.hits < self.min_hits]
+            evictable.sort(key=lambda track: (track.hits >= self.min_hits, track.last_t))
+            evicted = {id(track) for track in evictable[:excess]}
+            ended.extend(track for track in open_tracks if id(track) in evicted)
+            open_tracks = [track for track in open_tracks if id(track) not in evicted]
+        self.tracks = open_tracks
+        return self._finish(ended)
+
+    def flush(self):
+        """End every open track (end of clip)"""
+        ended, self.tracks = self.tracks, []
+        return self._finish(ended)
+
+
+def parse_gps_track(raw: str):
+    """Parse a JSON list of {"t": seconds, "lat": .., "lng": ..} points, sorted by time"""
+    if not raw or not raw.strip():
+        return []
+    points = []
+    for point in json.loads(raw):
+        t = point.get("t", point.get("time", point.get("offset")))
+        lat = point.get("lat", point.get("latitude"))
+        lng = point.get("lng", point.get("lon", point.get("longitude")))
+        if t is None or lat is None or lng is None:
+            raise ValueError("GPS track points need t, lat and lng")
+        points.append((float(t), float(lat), float(lng)))
+    return sorted(points)
+
+
+def interpolate_gps(points, t: float):
+    """Linearly interpolate (lat, lng) at `t` seconds, clamping outside the track"""
+    if not points:
+        return None, None
+    if t <= points[0][0]:
+        return points[0][1], points[0][2]
+    for (t0, lat0, lng0), (t1, lat1, lng1) in zip(points, points[1:]):
+        if t <= t1:
+            ratio = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+            return lat0 + (lat1 - lat0) * ratio, lng0 + (lng1 - lng0) * ratio
+    return points[-1][1], points[-1][2]
+
+
+def annotate_track(track):
+    """Copy of the track's best frame with its billboard box drawn on it"""
+    image = track.best_frame.copy()
+    x1, y1, x2, y2 = (int(v) for v in track.best_box)
+    cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 3)
+    caption = f"{track.label or 'billboard'} {track.best_confidence:.2f}"
+    cv2.putText(image, caption, (x1, max(20, y1 - 8)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+    return image
+
+
+async def analyze_video(path: str, infer_batch, on_billboard, batch_size: int = 8,
+                        tracker: BillboardTracker = None, **sampling):
+    """Stream a video through sampling, pool inference and tracking.
+
+    `infer_batch(frames)` is awaited for one (image, detections) pair per
+    frame; sampled frames are sent `batch_size` at a time so the model sees
+    them as batches. `on_billboard(track)` is awaited as soon as each track
+    ends. Returns frame statistics.
+    """
+    tracker = tracker or BillboardTracker()
+    stats = {}
+    frames = sample_frames(path, stats=stats, **sampling)
+    billboards = 0
+    try:
+        while True:
+            batch = []
+            while len(batch) < batch_size:
+                item = await asyncio.to_thread(next, frames, None)
+                if item is None:
+                    break
+                batch.append(item)
+            if not batch:
+                break
+            results = await infer_batch([frame for _, _, frame in batch])
+            for (index, t, frame), (_, detections) in zip(batch, results):
+                for track in tracker.update(index, t, frame, detections):
+                    await on_billboard(track)
+                    track.best_frame = None
+                    billboards += 1
+            if len(batch) < batch_size:
+                break
+        for track in tracker.flush():
+            await on_billboard(track)
+            track.best_frame = None
+            billboards += 1
+    finally:
+        frames.close()
+    stats["billboards"] = billboards
+    return stats